@@ -0,0 +1,81 @@
+# ass_captions.py
+from typing import List, Tuple
+
+from caption_style import DEFAULT_CAPTION_STYLE, CaptionStyle, hex_to_rgb
+
+
+def _ass_color(color: str) -> str:
+    # ASS colours are &HAABBGGRR with 00 meaning opaque
+    r, g, b = hex_to_rgb(color)
+    return f"&H00{b:02X}{g:02X}{r:02X}"
+
+
+def _ass_time(seconds: float) -> str:
+    centiseconds = max(int(round(seconds * 100)), 0)
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+
+def _ass_text(text: str) -> str:
+    # Braces open override blocks and backslashes start escapes; neither occurs in
+    # narration, so swap them for look-alikes rather than fight libass quoting.
+    return text.replace("\\", "/").replace("{", "(").replace("}", ")").replace("\n", " ")
+
+
+def captions_to_ass(captions: List[Tuple[float, float, str]], width: int, height: int, style: CaptionStyle = DEFAULT_CAPTION_STYLE) -> str:
+    """
+    Build an ASS subtitle script reproducing the moviepy caption look.
+
+    Captions are bottom-centred with ``style.bottom_padding`` of the frame height
+    below them, filled and stroked like the Pillow caption sprites, and faded in
+    and out over ``style.fade_duration``. The script's PlayRes is the render size,
+    so font size and stroke are in output pixels.
+
+    Args:
+        captions (List[Tuple[float, float, str]]): (start_time, end_time, text) in seconds,
+            as returned by ``generate_dynamic_captions_from_words``.
+        width (int): Width of the video the script is rendered onto.
+        height (int): Height of the video the script is rendered onto.
+        style (CaptionStyle, optional): Caption look. Defaults to DEFAULT_CAPTION_STYLE.
+
+    Returns:
+        str: The ASS script.
+    """
+    fade_ms = int(style.fade_duration * 1000)
+    margin_v = int(height * style.bottom_padding)
+
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 2",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+        "Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Caption,{style.font_name},{style.font_size},{_ass_color(style.color)},{_ass_color(style.color)},"
+        f"{_ass_color(style.stroke_color)},&H00000000,-1,0,0,0,100,100,0,0,1,{style.stroke_width:g},0,2,0,0,{margin_v},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for start_time, end_time, text in captions:
+        lines.append(
+            f"Dialogue: 0,{_ass_time(start_time)},{_ass_time(end_time)},Caption,,0,0,0,,"
+            f"{{\\fad({fade_ms},{fade_ms})}}{_ass_text(text)}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def write_ass_file(captions: List[Tuple[float, float, str]], output_path: str, width: int, height: int, style: CaptionStyle = DEFAULT_CAPTION_STYLE) -> str:
+    """
+    Write ``captions_to_ass`` output to ``output_path`` and return the path.
+    """
+    with open(output_path, "w", encoding="utf-8") as ass_file:
+        ass_file.write(captions_to_ass(captions, width, height, style))
+    return output_path
@@ -0,0 +1,146 @@
+# audio_mix.py
+import os
+import json
+import hashlib
+import logging
+import subprocess
+from typing import Optional
+
+from constants import MUSIC_CACHE_DIR
+from ffmpeg_utils import atempo_filter, run_ffmpeg
+from metrics import timed
+
+# Sample format of the pre-decoded music bed and of the mixed output
+MIX_SAMPLE_RATE = 48000
+MIX_CHANNELS = 2
+
+
+def prepare_music_bed(music_path: str, cache_dir: str = MUSIC_CACHE_DIR, timeout: int = 300) -> str:
+    """
+    Decode and resample a music track once into a cached PCM WAV.
+
+    The bed is keyed by the track's path, size and mtime, so every story mixes
+    from the same already-decoded file instead of decoding the MP3 again.
+
+    Args:
+        music_path (str): Path to the music file.
+        cache_dir (str, optional): Where beds are kept. Defaults to MUSIC_CACHE_DIR.
+        timeout (int, optional): Timeout for the FFmpeg command in seconds. Defaults to 300.
+
+    Returns:
+        str: Path to the cached bed.
+    """
+    if not os.path.exists(music_path):
+        logging.error(f"Music file does not exist: {music_path}")
+        raise FileNotFoundError(f"Music file not found: {music_path}")
+
+    stat = os.stat(music_path)
+    identity = json.dumps([os.path.abspath(music_path), stat.st_size, stat.st_mtime, MIX_SAMPLE_RATE, MIX_CHANNELS])
+    bed_path = os.path.join(cache_dir, hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16] + ".wav")
+    if os.path.exists(bed_path):
+        return bed_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{bed_path}.{os.getpid()}.tmp.wav"
+    command = [
+        'ffmpeg', '-y',
+        '-i', music_path,
+        '-vn',
+        '-ac', str(MIX_CHANNELS),
+        '-ar', str(MIX_SAMPLE_RATE),
+        '-c:a', 'pcm_s16le',
+        tmp_path
+    ]
+    logging.info(f"Running FFmpeg command: {' '.join(command)}")
+    try:
+        run_ffmpeg(command, timeout=timeout, label="prepare_music_bed")
+        os.replace(tmp_path, bed_path)
+    except subprocess.TimeoutExpired:
+        logging.error(f"FFmpeg command timed out after {timeout} seconds.")
+        raise TimeoutError(f"FFmpeg command exceeded timeout of {timeout} seconds.")
+    except subprocess.CalledProcessError as e:
+        logging.error(f"FFmpeg failed to decode music: {e.stderr}")
+        raise e
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return bed_path
+
+
+def needs_music(music_path: Optional[str], music_gain: float) -> bool:
+    """
+    Whether mixing music would change the audio at all.
+    """
+    return bool(music_path) and music_gain > 0
+
+
+@timed("mix_audio")
+def mix_audio(narration: str, output_audio: str, music_path: Optional[str] = None, music_gain: float = 0.0, ducking: bool = False, playback_rate: float = 1.0, timeout: int = 300) -> str:
+    """
+    Mix looping background music under the narration with FFmpeg.
+
+    At zero gain (or with no music) nothing is decoded or written and the
+    narration path is returned as is. Otherwise the cached bed is looped with
+    ``-stream_loop``, scaled, optionally ducked under the voice with
+    ``sidechaincompress``, and combined with ``amix`` for exactly the
+    narration's length. A ``playback_rate`` other than 1.0 is applied to the
+    narration alone, before the mix, so the music keeps its tempo. The result
+    is FLAC so the final AAC encode is the only lossy step.
+
+    Args:
+        narration (str): Path to the narration audio (or a video with a narration track).
+        output_audio (str): Path for the mixed audio; ``.flac`` is recommended.
+        music_path (str, optional): Background music file. Defaults to None.
+        music_gain (float, optional): Linear music volume. Defaults to 0.0, i.e. no music.
+        ducking (bool, optional): Lower the music while the narrator speaks. Defaults to False.
+        playback_rate (float, optional): Narration speed, pitch preserved. Ignored when no
+            mix is needed; the caller applies it downstream then. Defaults to 1.0.
+        timeout (int, optional): Timeout for the FFmpeg command in seconds. Defaults to 300.
+
+    Returns:
+        str: Path of the audio to use downstream: output_audio, or narration when no mix was needed.
+    """
+    if not needs_music(music_path, music_gain):
+        return narration
+    if not os.path.exists(narration):
+        logging.error(f"Narration does not exist: {narration}")
+        raise FileNotFoundError(f"Narration not found: {narration}")
+
+    bed = prepare_music_bed(music_path)
+    tempo = atempo_filter(playback_rate)
+    voice = f"[0:a]{tempo + ',' if tempo else ''}aresample={MIX_SAMPLE_RATE},aformat=channel_layouts=stereo"
+    music = f"[1:a]volume={music_gain:g}"
+    if ducking:
+        filter_complex = (
+            f"{voice},asplit=2[voice][key];"
+            f"{music}[bed];"
+            f"[bed][key]sidechaincompress=threshold=0.05:ratio=8:attack=20:release=300[ducked];"
+            f"[voice][ducked]amix=inputs=2:duration=first:normalize=0[mix]"
+        )
+    else:
+        filter_complex = (
+            f"{voice}[voice];"
+            f"{music}[bed];"
+            f"[voice][bed]amix=inputs=2:duration=first:normalize=0[mix]"
+        )
+
+    command = [
+        'ffmpeg', '-y',
+        '-i', narration,
+        '-stream_loop', '-1',   # Loop the bed for as long as the narration lasts
+        '-i', bed,
+        '-filter_complex', filter_complex,
+        '-map', '[mix]',
+        '-vn',
+        output_audio
+    ]
+    logging.info(f"Running FFmpeg command: {' '.join(command)}")
+    try:
+        run_ffmpeg(command, timeout=timeout, label="mix_audio")
+    except subprocess.TimeoutExpired:
+        logging.error(f"FFmpeg command timed out after {timeout} seconds.")
+        raise TimeoutError(f"FFmpeg command exceeded timeout of {timeout} seconds.")
+    except subprocess.CalledProcessError as e:
+        logging.error(f"FFmpeg failed to mix audio: {e.stderr}")
+        raise e
+    return output_audio
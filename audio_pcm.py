@@ -0,0 +1,52 @@
+# audio_pcm.py
+import io
+import os
+import wave
+import subprocess
+
+import numpy as np
+
+from transcript_cache import PCM_SAMPLE_RATE
+
+
+def decode_pcm(audio_file: str, sample_rate: int = PCM_SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode the audio of any file ffmpeg can read into mono 16-bit PCM in memory.
+
+    One ffmpeg process reads the source (the narration MP3 or a muxed video) and
+    resamples it on the way out, so nothing is written to disk.
+
+    Args:
+        audio_file (str): Path to an audio or video file.
+        sample_rate (int, optional): Output sample rate. Defaults to 16 kHz, what the transcriber expects.
+
+    Returns:
+        np.ndarray: 1-D int16 array of samples.
+    """
+    if not os.path.exists(audio_file):
+        raise FileNotFoundError(f"Audio file not found: {audio_file}")
+
+    command = [
+        'ffmpeg', '-v', 'error',
+        '-i', audio_file,
+        '-vn', '-ac', '1', '-ar', str(sample_rate),
+        '-f', 's16le', 'pipe:1'
+    ]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=process.stderr.decode(errors="replace"))
+    return np.frombuffer(process.stdout, dtype="<i2")
+
+
+def pcm_to_wav(pcm: np.ndarray, sample_rate: int = PCM_SAMPLE_RATE) -> io.BytesIO:
+    """
+    Wrap mono 16-bit PCM in an in-memory WAV file, rewound and ready to upload.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.astype("<i2", copy=False).tobytes())
+    buffer.seek(0)
+    return buffer
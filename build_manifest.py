@@ -0,0 +1,78 @@
+# build_manifest.py
+import os
+import json
+import time
+import hashlib
+from typing import Dict, List, Optional
+
+
+def fingerprint(*parts) -> str:
+    """
+    Stable sha256 of JSON-serializable parts, used as a stage's input key.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_identity(path: Optional[str]) -> Optional[list]:
+    """
+    (absolute path, size, mtime) of an input file, so replacing it changes every key
+    built from it without hashing its contents. None for no path; size and mtime are
+    None for a missing file.
+    """
+    if not path:
+        return None
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [path, None, None]
+    return [path, stat.st_size, stat.st_mtime]
+
+
+class StoryManifest:
+    """
+    Record of the stages completed for one story.
+
+    Each stage entry holds the key it was built from (a fingerprint of its
+    parameters and the keys of the stages it depends on), the parameters
+    themselves, its output artifacts and any small results later stages need
+    (duration, word timings, chosen footage). A stage is fresh when its
+    recorded key matches and every output still exists, so a rerun only
+    rebuilds what changed, make-style.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stages: Dict[str, dict] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as manifest_file:
+                self.stages = json.load(manifest_file).get("stages", {})
+        except (FileNotFoundError, ValueError):
+            self.stages = {}
+
+    def is_fresh(self, stage: str, key: str) -> bool:
+        entry = self.stages.get(stage)
+        if not entry or entry["key"] != key:
+            return False
+        return all(os.path.exists(path) for path in entry["outputs"])
+
+    def meta(self, stage: str) -> dict:
+        return self.stages[stage]["meta"]
+
+    def record(self, stage: str, key: str, params: dict, outputs: List[str], meta: Optional[dict] = None):
+        self.stages[stage] = {
+            "key": key,
+            "params": params,
+            "outputs": outputs,
+            "meta": meta or {},
+            "completed_at": time.time(),
+        }
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump({"stages": self.stages}, manifest_file, indent=1)
+        os.replace(tmp_path, self.path)
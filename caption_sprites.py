@@ -0,0 +1,51 @@
+# caption_sprites.py
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from caption_style import DEFAULT_CAPTION_STYLE, CaptionStyle, hex_to_rgb
+
+# Enough for every distinct caption across a large batch of stories
+SPRITE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=32)
+def _load_font(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font_path, font_size)
+
+
+@lru_cache(maxsize=SPRITE_CACHE_SIZE)
+def render_caption_sprite(text: str, style: CaptionStyle = DEFAULT_CAPTION_STYLE) -> np.ndarray:
+    """
+    Rasterize a caption with its stroke into an RGBA array using Pillow.
+
+    Results are memoized per (text, style), so words and phrases that recur
+    across captions and stories are only rendered once per process. The
+    returned array is shared between callers and marked read-only.
+
+    Args:
+        text (str): Caption text.
+        style (CaptionStyle, optional): Caption look. Defaults to DEFAULT_CAPTION_STYLE.
+
+    Returns:
+        np.ndarray: H x W x 4 uint8 RGBA sprite, tightly fitted around the stroked text.
+    """
+    font = _load_font(style.font_path, style.font_size)
+    stroke = style.stroke_width
+    left, top, right, bottom = font.getbbox(text, stroke_width=stroke)
+    width, height = max(right - left, 1), max(bottom - top, 1)
+
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.text(
+        (-left, -top), text, font=font,
+        fill=hex_to_rgb(style.color) + (255,),
+        stroke_width=stroke,
+        stroke_fill=hex_to_rgb(style.stroke_color) + (255,)
+    )
+
+    sprite = np.asarray(image)
+    sprite.flags.writeable = False
+    return sprite
+
@@ -0,0 +1,33 @@
+# caption_style.py
+import os
+from typing import NamedTuple, Tuple
+
+
+class CaptionStyle(NamedTuple):
+    """
+    Visual style shared by every caption renderer, so the moviepy, ASS and any
+    other path produce the same look.
+    """
+    font_path: str = "./Montserrat-Bold.otf"
+    font_name: str = "Montserrat"  # Family name of font_path, which libass looks fonts up by
+    font_size: int = 75
+    color: str = "#ffffff"
+    stroke_color: str = "#000000"
+    stroke_width: int = 3  # Outline drawn outside the glyph edge, in output pixels
+    bottom_padding: float = 0.25  # Fraction of the video height kept below the caption
+    fade_duration: float = 0.1
+
+    @property
+    def font_dir(self) -> str:
+        return os.path.dirname(os.path.abspath(self.font_path))
+
+
+DEFAULT_CAPTION_STYLE = CaptionStyle()
+
+
+def hex_to_rgb(color: str) -> Tuple[int, int, int]:
+    """
+    Convert '#rrggbb' to an (r, g, b) tuple.
+    """
+    color = color.lstrip("#")
+    return int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16)
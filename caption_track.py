@@ -0,0 +1,104 @@
+# caption_track.py
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from caption_sprites import render_caption_sprite
+from caption_style import DEFAULT_CAPTION_STYLE, CaptionStyle
+
+
+class _Sprite:
+    """
+    A caption sprite split into premultiplied colour and alpha, clipped to the frame.
+    """
+
+    def __init__(self, text: str, style: CaptionStyle, frame_width: int, frame_height: int):
+        sprite = render_caption_sprite(text, style)
+        height, width = sprite.shape[:2]
+        # Centred, with bottom_padding of the frame height below the caption
+        x = (frame_width - width) // 2
+        y = int(frame_height - height - frame_height * style.bottom_padding)
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + width, frame_width), min(y + height, frame_height)
+        sprite = sprite[top - y:bottom - y, left - x:right - x]
+
+        self.region = (slice(top, bottom), slice(left, right))
+        self.alpha = sprite[:, :, 3:4].astype(np.float32) / 255.0
+        self.color = sprite[:, :, :3].astype(np.float32) * self.alpha
+
+    def blend(self, frame: np.ndarray, opacity: float):
+        region = frame[self.region]
+        blended = region * (1.0 - self.alpha * opacity) + self.color * opacity
+        region[...] = blended.astype(np.uint8)
+
+
+class CaptionTrack:
+    """
+    All of a story's captions as one time-indexed overlay.
+
+    Captions are kept in arrays sorted by start time. The captions showing at
+    time t are found by bisection, within a window no wider than the longest
+    caption, and faded analytically, so the cost of a frame depends on how many
+    captions overlap it rather than on how many the story has. Sprites come
+    from the shared Pillow cache and are prepared once per distinct text.
+
+    Use ``composite`` on frames you own (the piped renderer) or ``clip`` to get
+    a single moviepy clip in place of one clip per caption.
+    """
+
+    def __init__(self, captions: List[Tuple[float, float, str]], frame_width: int, frame_height: int, style: CaptionStyle = DEFAULT_CAPTION_STYLE, fade_duration: float = None):
+        captions = sorted(captions)
+        self.starts = [start for start, _, _ in captions]
+        self.ends = [end for _, end, _ in captions]
+        self.texts = [text for _, _, text in captions]
+        self.longest = max((end - start for start, end, _ in captions), default=0.0)
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.style = style
+        self.fade_duration = style.fade_duration if fade_duration is None else fade_duration
+        self._sprites: Dict[str, _Sprite] = {}
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _sprite(self, text: str) -> _Sprite:
+        sprite = self._sprites.get(text)
+        if sprite is None:
+            sprite = self._sprites[text] = _Sprite(text, self.style, self.frame_width, self.frame_height)
+        return sprite
+
+    def opacity(self, index: int, t: float) -> float:
+        """
+        Linear fade in and out over ``fade_duration``, like crossfadein/crossfadeout.
+        """
+        if self.fade_duration <= 0:
+            return 1.0
+        return max(0.0, min(1.0, (t - self.starts[index]) / self.fade_duration, (self.ends[index] - t) / self.fade_duration))
+
+    def active(self, t: float) -> List[int]:
+        """
+        Indices of the captions showing at time t, in start order.
+        """
+        # Only captions that started within one longest-caption span of t can still be showing
+        first = bisect_left(self.starts, t - self.longest)
+        last = bisect_right(self.starts, t)
+        return [i for i in range(first, last) if t < self.ends[i]]
+
+    def composite(self, frame: np.ndarray, t: float) -> np.ndarray:
+        """
+        Blend the captions showing at time t onto a writable H x W x 3 uint8 frame, in place.
+        """
+        for index in self.active(t):
+            opacity = self.opacity(index, t)
+            if opacity > 0:
+                self._sprite(self.texts[index]).blend(frame, opacity)
+        return frame
+
+    def clip(self, video):
+        """
+        ``video`` with the captions burned in, as a single moviepy clip.
+        """
+        def burn(get_frame, t):
+            return self.composite(np.array(get_frame(t)), t)
+        return video.fl(burn)
@@ -0,0 +1,209 @@
+# cli.py
+"""
+Command-line entry point with one subcommand per stage.
+
+Only argparse and the standard library are imported up front; each handler
+imports the backend it needs (edge-tts for ``tts``, moviepy for ``caption``,
+FFmpeg helpers and a transcriber for ``render``, the pipeline for ``run``), so
+``--help`` and small jobs start without loading everything.
+
+    python cli.py tts --story 3 -o story3.mp3
+    python cli.py caption output/story_3.mp4 --audio output/audio/story_3.mp3
+    python cli.py render story3.mp3 story3.mp4 --words story3.json
+    python cli.py run --first 1 --last 10 --renditions
+    python cli.py check-imports
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+import subprocess
+
+# Modules that must not be loaded just by importing the entry points
+HEAVY_MODULES = (
+    "moviepy", "pydub", "speech_recognition", "requests", "assemblyai", "dotenv",
+    "edge_tts", "aiohttp", "numpy", "PIL",
+)
+# Entry-point import budget in seconds, measured in a fresh interpreter
+IMPORT_BUDGET = 0.25
+
+
+def _story_text(args: argparse.Namespace) -> str:
+    if args.text is not None:
+        return args.text
+    from story_parser import StoryIndex
+
+    return StoryIndex(args.stories_file).get(args.story)
+
+
+def cmd_tts(args: argparse.Namespace) -> int:
+    import asyncio
+    from tts_cache import TTSCache
+    from tts_utils import synthesize_speech_with_retry
+
+    text = _story_text(args)
+    cache = None if args.no_cache else TTSCache()
+    duration, words = asyncio.run(synthesize_speech_with_retry(text, args.output, args.voice, rate=args.rate, pitch=args.pitch, cache=cache))
+    words_file = args.words or os.path.splitext(args.output)[0] + ".json"
+    with open(words_file, "w", encoding="utf-8") as f:
+        json.dump({"duration": duration, "words": [list(w) for w in words]}, f)
+    logging.info(f"Narration saved at {args.output} ({duration:.2f}s, {len(words)} words in {words_file})")
+    return 0
+
+
+def _load_words(words_file: str):
+    from word_timings import Word
+
+    with open(words_file, encoding="utf-8") as f:
+        return [Word(*w) for w in json.load(f)["words"]]
+
+
+def cmd_caption(args: argparse.Namespace) -> int:
+    from subtitle_utils import auto_caption
+
+    words = _load_words(args.words) if args.words else None
+    auto_caption(args.video, words=words, audio_file=args.audio)
+    return 0
+
+
+def cmd_render(args: argparse.Namespace) -> int:
+    from ffmpeg_utils import DEFAULT_RENDITIONS, get_video_duration, render_story
+    from mp3_utils import probe_mp3_duration
+    from subtitle_utils import generate_dynamic_captions_from_words
+
+    if args.words:
+        words = _load_words(args.words)
+    else:
+        import asyncio
+        from transcript_cache import TranscriptCache
+        from transcription import make_backend
+
+        words = asyncio.run(make_backend(args.transcription_backend).transcribe(args.audio, TranscriptCache()))
+
+    if args.audio.lower().endswith(".mp3"):
+        duration = probe_mp3_duration(args.audio)
+    else:
+        duration = get_video_duration(args.audio)
+    render_story(
+        input_video=args.input_video,
+        audio_file=args.audio,
+        captions=generate_dynamic_captions_from_words(words, playback_rate=args.playback_rate),
+        output_video=args.output,
+        desired_duration=duration / args.playback_rate,
+        fps=args.fps,
+        target_width=args.width,
+        target_height=args.height,
+        crf=args.crf,
+        preset=args.preset,
+        start_time=args.start,
+        renditions=list(DEFAULT_RENDITIONS) if args.renditions else None,
+        playback_rate=args.playback_rate
+    )
+    logging.info(f"Video with caption saved: {args.output}")
+    return 0
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    from main import main_from_args
+
+    main_from_args(args)
+    return 0
+
+
+def measure_imports(modules=("cli", "main", "pipeline")) -> dict:
+    """
+    Import the entry points in a fresh interpreter and report how long it took
+    and which heavy modules came along.
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"for name in {list(modules)!r}: __import__(name)\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = sorted(m for m in {list(HEAVY_MODULES)!r} if m in sys.modules)\n"
+        "print(json.dumps({'seconds': elapsed, 'heavy': heavy}))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-c", code], cwd=here, stdout=subprocess.PIPE, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def cmd_check_imports(args: argparse.Namespace) -> int:
+    # Best of a few runs, so a cold filesystem cache doesn't fail the check
+    reports = [measure_imports() for _ in range(args.repeat)]
+    seconds = min(report["seconds"] for report in reports)
+    heavy = reports[-1]["heavy"]
+    print(f"Entry-point imports: {seconds * 1000:.0f} ms (budget {args.budget * 1000:.0f} ms)")
+    ok = True
+    if heavy:
+        print(f"Loaded at import time: {', '.join(heavy)}")
+        ok = False
+    if seconds > args.budget:
+        print("Import time is over budget")
+        ok = False
+    return 0 if ok else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from main import INPUT_VIDEO, STORIES_FILE, add_run_arguments
+
+    parser = argparse.ArgumentParser(description="Narrated, captioned story videos, one stage at a time or as a batch.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    tts = commands.add_parser("tts", help="Synthesize a story's narration and word timings")
+    source = tts.add_mutually_exclusive_group(required=True)
+    source.add_argument("--story", type=int, help="Story number in --stories-file")
+    source.add_argument("--text", help="Text to narrate")
+    tts.add_argument("--stories-file", default=STORIES_FILE, help="Story file to read")
+    tts.add_argument("-o", "--output", required=True, help="MP3 to write")
+    tts.add_argument("--words", default=None, help="Word timings JSON to write (default: next to the MP3)")
+    tts.add_argument("--voice", default="en-US-ChristopherNeural")
+    tts.add_argument("--rate", default="+0%")
+    tts.add_argument("--pitch", default="+0Hz")
+    tts.add_argument("--no-cache", action="store_true", help="Always synthesize, bypassing the narration cache")
+    tts.set_defaults(handler=cmd_tts)
+
+    caption = commands.add_parser("caption", help="Burn captions into a narrated video")
+    caption.add_argument("video", help="Narrated video")
+    caption.add_argument("--audio", default=None, help="Narration to transcribe instead of the video's audio")
+    caption.add_argument("--words", default=None, help="Word timings JSON from `tts`; skips transcription")
+    caption.set_defaults(handler=cmd_caption)
+
+    render = commands.add_parser("render", help="Cut, caption and mux one narration over background footage")
+    render.add_argument("audio", help="Narration")
+    render.add_argument("output", help="Video to write")
+    render.add_argument("--words", default=None, help="Word timings JSON from `tts`; otherwise the narration is transcribed")
+    render.add_argument("--transcription-backend", default="assemblyai", help="Transcriber used without --words")
+    render.add_argument("--input-video", default=INPUT_VIDEO, help="Background footage")
+    render.add_argument("--start", type=float, default=None, help="Start of the footage segment (default: random)")
+    render.add_argument("--fps", type=int, default=60)
+    render.add_argument("--width", type=int, default=1080)
+    render.add_argument("--height", type=int, default=1920)
+    render.add_argument("--crf", type=int, default=25)
+    render.add_argument("--preset", default="slow")
+    render.add_argument("--renditions", action="store_true", help="Also write the 720p30 and 360p preview renditions")
+    render.add_argument("--playback-rate", type=float, default=1.0, help="Narration speed; pitch is preserved")
+    render.set_defaults(handler=cmd_render)
+
+    run = commands.add_parser("run", help="Run the whole pipeline over a range of stories (same options as main.py)")
+    add_run_arguments(run)
+    run.set_defaults(handler=cmd_run)
+
+    check = commands.add_parser("check-imports", help="Fail if importing the entry points is slow or loads a heavy backend")
+    check.add_argument("--budget", type=float, default=IMPORT_BUDGET, help="Allowed import time in seconds")
+    check.add_argument("--repeat", type=int, default=3)
+    check.set_defaults(handler=cmd_check_imports)
+    return parser
+
+
+def cli(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command != "run":
+        # main() sets up its own file logging for batch runs
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
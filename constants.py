@@ -16,3 +16,22 @@ STORIES_FILE = os.path.join(BASE_DIR, "stories.txt")
 
 # Path to FFmpeg executable
 FFMPEG_PATH = "C:/ffmpeg/bin/ffmpeg.exe"  # Ensure this path is correct
+
+# On-disk cache of synthesized narration, evicted LRU beyond the byte budget
+TTS_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "tts")
+TTS_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Transcripts keyed by a hash of the decoded narration PCM
+TRANSCRIPT_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "transcripts")
+
+# Probe metadata and usage of the background footage sources
+FOOTAGE_INDEX_PATH = os.path.join(OUTPUT_DIR, "cache", "footage_index.json")
+
+# Background footage pre-normalized into closed-GOP segments
+SEGMENT_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "segments")
+
+# Encoder profile written by encoder_bench.py and loaded by the pipeline
+ENCODER_PROFILE_PATH = os.path.join(OUTPUT_DIR, "encoder_profile.json")
+
+# Background music decoded and resampled once for ffmpeg mixing
+MUSIC_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "music")
@@ -0,0 +1,192 @@
+# encoder_bench.py
+import os
+import re
+import json
+import time
+import logging
+import argparse
+import itertools
+import subprocess
+import tempfile
+from typing import Dict, List, Optional, Sequence
+
+from constants import ENCODER_PROFILE_PATH
+from ffmpeg_utils import create_video, scale_crop_filter
+
+# Settings a profile may override in create_video/render_story
+PROFILE_KEYS = ("preset", "crf", "threads", "x264_params")
+
+
+def make_synthetic_source(output_video: str, pattern: str = "testsrc2", duration: float = 10.0, width: int = 1920, height: int = 1080, fps: int = 60):
+    """
+    Render a lavfi test pattern to a (visually lossless) file so benchmarks run offline.
+
+    Args:
+        output_video (str): Path to save the source.
+        pattern (str, optional): lavfi source, e.g. "testsrc2" or "mandelbrot". Defaults to "testsrc2".
+        duration (float, optional): Length in seconds. Defaults to 10.
+        width (int, optional): Source width. Defaults to 1920.
+        height (int, optional): Source height. Defaults to 1080.
+        fps (int, optional): Source frame rate. Defaults to 60.
+    """
+    command = [
+        'ffmpeg', '-y',
+        '-f', 'lavfi',
+        '-i', f"{pattern}=size={width}x{height}:rate={fps}",
+        '-t', str(duration),
+        '-c:v', 'libx264',
+        '-preset', 'ultrafast',
+        '-qp', '0',
+        '-pix_fmt', 'yuv420p',
+        output_video
+    ]
+    logging.info(f"Running FFmpeg command: {' '.join(command)}")
+    subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def measure_quality(encoded_video: str, source_video: str, fps: int, target_width: int, target_height: int) -> Dict[str, float]:
+    """
+    Compare an encode against the source put through the same scale/crop/fps chain.
+
+    Returns:
+        Dict[str, float]: "ssim" (All, 0-1) and "psnr" (average dB).
+    """
+    reference = f"[1:v]{scale_crop_filter(target_width, target_height)},fps={fps}[ref]"
+    command = [
+        'ffmpeg', '-v', 'info',
+        '-i', encoded_video,
+        '-i', source_video,
+        '-lavfi', f"{reference};[0:v]split[a][b];[ref]split[r1][r2];[a][r1]ssim;[b][r2]psnr",
+        '-f', 'null', '-'
+    ]
+    result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    ssim = re.search(r"SSIM .*All:([\d.]+)", result.stderr)
+    psnr = re.search(r"PSNR .*average:([\d.]+|inf)", result.stderr)
+    return {
+        "ssim": float(ssim.group(1)) if ssim else 0.0,
+        "psnr": float(psnr.group(1)) if psnr else 0.0,
+    }
+
+
+def run_benchmark(source_video: str, presets: Sequence[str], crfs: Sequence[int], threads: Sequence[Optional[int]], x264_params: Sequence[Optional[str]], duration: float, fps: int = 60, target_width: int = 1080, target_height: int = 1920) -> List[dict]:
+    """
+    Encode source_video through create_video for every combination of settings.
+
+    Returns:
+        List[dict]: One record per combination with the settings, encode fps,
+        output bitrate (kbps), SSIM and PSNR.
+    """
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="encoder_bench_")
+    for preset, crf, thread_count, params in itertools.product(presets, crfs, threads, x264_params):
+        output_video = os.path.join(work_dir, "bench.mp4")
+        started = time.perf_counter()
+        create_video(
+            input_video=source_video,
+            output_video=output_video,
+            desired_duration=duration,
+            start_time=0.0,
+            fps=fps,
+            target_width=target_width,
+            target_height=target_height,
+            crf=crf,
+            preset=preset,
+            threads=thread_count,
+            x264_params=params
+        )
+        elapsed = time.perf_counter() - started
+
+        record = {
+            "preset": preset,
+            "crf": crf,
+            "threads": thread_count,
+            "x264_params": params,
+            "encode_fps": duration * fps / elapsed,
+            "bitrate_kbps": os.path.getsize(output_video) * 8 / duration / 1000,
+        }
+        record.update(measure_quality(output_video, source_video, fps, target_width, target_height))
+        logging.info(f"Benchmark result: {record}")
+        results.append(record)
+        os.remove(output_video)
+    os.rmdir(work_dir)
+    return results
+
+
+def recommend_profile(results: List[dict], target_fps: float) -> dict:
+    """
+    Pick the best-quality settings that still encode at least target_fps.
+
+    Among combinations meeting the throughput target, the highest SSIM wins,
+    with lower bitrate breaking ties. If none meets it, the fastest is returned.
+    """
+    fast_enough = [r for r in results if r["encode_fps"] >= target_fps]
+    if fast_enough:
+        best = max(fast_enough, key=lambda r: (r["ssim"], -r["bitrate_kbps"]))
+    else:
+        logging.warning(f"No setting reached {target_fps} fps; recommending the fastest one.")
+        best = max(results, key=lambda r: r["encode_fps"])
+    return {
+        **{key: best[key] for key in PROFILE_KEYS},
+        "target_fps": target_fps,
+        "measured": {key: best[key] for key in ("encode_fps", "bitrate_kbps", "ssim", "psnr")},
+    }
+
+
+def save_encoder_profile(profile: dict, path: str = ENCODER_PROFILE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as profile_file:
+        json.dump(profile, profile_file, indent=2)
+
+
+def load_encoder_profile(path: str = ENCODER_PROFILE_PATH) -> dict:
+    """
+    Load a benchmarked encoder profile as keyword arguments for create_video/render_story.
+
+    Returns:
+        dict: preset/crf/threads/x264_params, or an empty dict if no profile has been saved.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as profile_file:
+            profile = json.load(profile_file)
+    except FileNotFoundError:
+        return {}
+    return {key: profile[key] for key in PROFILE_KEYS if profile.get(key) is not None}
+
+
+def _optional_int(value: str) -> Optional[int]:
+    return None if value in ("auto", "0") else int(value)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Benchmark x264 settings for create_video and save a recommended profile.")
+    parser.add_argument("--pattern", default="testsrc2", help="lavfi source for the synthetic input (testsrc2, mandelbrot, ...)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of video to encode per run")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--width", type=int, default=1080)
+    parser.add_argument("--height", type=int, default=1920)
+    parser.add_argument("--presets", nargs="+", default=["slow", "medium", "fast", "faster"])
+    parser.add_argument("--crfs", nargs="+", type=int, default=[23, 25, 27])
+    parser.add_argument("--threads", nargs="+", type=_optional_int, default=[None], help="Thread counts to try; 'auto' leaves it to x264")
+    parser.add_argument("--x264-params", nargs="+", default=[None], help="x264-params strings to try, e.g. 'rc-lookahead=20:ref=2'")
+    parser.add_argument("--target-fps", type=float, default=60.0, help="Required encode throughput in frames per second")
+    parser.add_argument("--output", default=ENCODER_PROFILE_PATH, help="Where to write the recommended profile")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="encoder_bench_src_") as source_dir:
+        source_video = os.path.join(source_dir, "source.mp4")
+        make_synthetic_source(source_video, args.pattern, args.duration, fps=args.fps)
+        results = run_benchmark(source_video, args.presets, args.crfs, args.threads, args.x264_params, args.duration, args.fps, args.width, args.height)
+
+    for record in sorted(results, key=lambda r: -r["encode_fps"]):
+        print(f"{record['preset']:>9} crf={record['crf']:<3} threads={record['threads'] or 'auto':<5} "
+              f"{record['encode_fps']:7.1f} fps {record['bitrate_kbps']:8.0f} kbps ssim={record['ssim']:.4f} psnr={record['psnr']:.2f}"
+              f"{'  ' + record['x264_params'] if record['x264_params'] else ''}")
+
+    profile = recommend_profile(results, args.target_fps)
+    save_encoder_profile(profile, args.output)
+    print(f"Recommended profile saved to {args.output}: {profile}")
+
+
+if __name__ == "__main__":
+    main()
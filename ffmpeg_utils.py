@@ -9,9 +9,15 @@ from constants import FFMPEG_PATH, OUTPUT_DIR
 # ffmpeg_utils.py
 
 import os
+import time
 import random
+import threading
 import subprocess
+from typing import List, NamedTuple, Optional, Tuple
 from constants import FFMPEG_PATH, OUTPUT_DIR
+from metrics import record_ffmpeg, timed
+from ass_captions import write_ass_file
+from caption_style import DEFAULT_CAPTION_STYLE, CaptionStyle
 
 def time_to_seconds(timestr: str) -> int:
     """
@@ -65,7 +71,231 @@ def get_video_duration(input_video: str) -> float:
         print(f"[ERROR] Failed to get video duration: {e.stderr}")
         raise
 
-def create_video(input_video: str, output_video: str, desired_duration: float, fps: int = 24, target_width: int = 1080, target_height: int = 1920, crf: int = 20, preset: str = "slow", timeout: int = 600):
+class FFmpegResult(NamedTuple):
+    stderr: str
+    progress: dict
+
+def _out_time_seconds(progress: dict) -> float:
+    try:
+        return int(progress.get("out_time_us", "0")) / 1_000_000
+    except ValueError:
+        return 0.0
+
+def run_ffmpeg(command: List[str], timeout: Optional[int] = None, label: str = "ffmpeg", log_interval: float = 5.0) -> FFmpegResult:
+    """
+    Run an FFmpeg command while parsing its live ``-progress`` output.
+
+    Progress (frame, fps, speed, out_time) is logged every ``log_interval`` seconds
+    and the final values are returned and attached to the current metrics trace.
+
+    Args:
+        command (List[str]): FFmpeg command line, starting with the executable.
+        timeout (int, optional): Kill FFmpeg after this many seconds. Defaults to no limit.
+        label (str, optional): Name used in logs and metrics. Defaults to "ffmpeg".
+        log_interval (float, optional): Seconds between progress log lines. Defaults to 5.
+
+    Returns:
+        FFmpegResult: The stderr text and a progress summary dict.
+
+    Raises:
+        subprocess.TimeoutExpired: If the timeout elapsed.
+        subprocess.CalledProcessError: If FFmpeg exited with an error.
+    """
+    command = [command[0], "-progress", "pipe:1", "-nostats", *command[1:]]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    # Drain stderr on a thread so a chatty FFmpeg can't block on a full pipe
+    stderr_chunks = []
+    stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    stderr_reader.start()
+
+    timed_out = threading.Event()
+    def kill():
+        timed_out.set()
+        process.kill()
+    watchdog = threading.Timer(timeout, kill) if timeout else None
+    if watchdog:
+        watchdog.start()
+
+    started = time.perf_counter()
+    last_log = started
+    progress = {}
+    try:
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            progress[key] = value
+            if key == "progress" and time.perf_counter() - last_log >= log_interval:
+                last_log = time.perf_counter()
+                logging.info(f"[{label}] frame={progress.get('frame')} fps={progress.get('fps')} speed={progress.get('speed')} out_time={progress.get('out_time')}")
+        process.wait()
+    finally:
+        if watchdog:
+            watchdog.cancel()
+        stderr_reader.join()
+    stderr = "".join(stderr_chunks)
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(command, timeout, stderr=stderr)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+
+    def number(key: str) -> float:
+        try:
+            return float(progress.get(key, "0").rstrip("x") or 0)
+        except ValueError:
+            return 0.0
+
+    summary = {
+        "label": label,
+        "wall_seconds": time.perf_counter() - started,
+        "frames": int(number("frame")),
+        "fps": number("fps"),
+        "speed": number("speed"),
+        "out_time_seconds": _out_time_seconds(progress),
+        "total_size": int(number("total_size")),
+    }
+    record_ffmpeg(summary)
+    return FFmpegResult(stderr, summary)
+
+def scale_crop_filter(target_width: int, target_height: int) -> str:
+    """
+    Build the filter that scales a source to cover target_width x target_height and crops the overflow.
+    """
+    return f"scale='if(gt(a,{target_width}/{target_height}),ceil({target_height}*a),{target_width})':'if(gt(a,{target_width}/{target_height}),{target_height},ceil({target_width}/a))', crop={target_width}:{target_height}"
+
+def x264_tuning_args(threads: Optional[int] = None, x264_params: Optional[str] = None) -> List[str]:
+    """
+    Optional libx264 threading and parameter overrides, e.g. from a benchmarked encoder profile.
+    """
+    args = []
+    if threads:
+        args += ["-threads", str(threads)]
+    if x264_params:
+        args += ["-x264-params", x264_params]
+    return args
+
+def atempo_filter(playback_rate: float) -> str:
+    """
+    Pitch-preserving speed change as an FFmpeg audio filter chain, or "" at 1.0.
+
+    One atempo instance only accepts factors from 0.5 to 2.0, so other rates are
+    chained, e.g. 3.0 becomes "atempo=2,atempo=1.5".
+    """
+    if playback_rate <= 0:
+        raise ValueError(f"Playback rate must be positive, got {playback_rate}")
+    if abs(playback_rate - 1.0) < 1e-9:
+        return ""
+    factors = []
+    while playback_rate > 2.0:
+        factors.append(2.0)
+        playback_rate /= 2.0
+    while playback_rate < 0.5:
+        factors.append(0.5)
+        playback_rate /= 0.5
+    factors.append(playback_rate)
+    return ",".join(f"atempo={factor:.6g}" for factor in factors)
+
+def playback_rate_args(playback_rate: float = 1.0) -> List[str]:
+    """
+    Output options that play the audio at ``playback_rate``; empty at 1.0 so the audio passes untouched.
+    """
+    chain = atempo_filter(playback_rate)
+    return ['-filter:a', chain] if chain else []
+
+class RenditionProfile(NamedTuple):
+    """
+    An extra output encoded alongside the main render, e.g. a lower-resolution platform copy or a review preview.
+    """
+    name: str
+    width: int
+    height: int
+    fps: int
+    crf: int = 23
+    preset: str = "medium"
+
+# 720p copy for other platforms and a small, fast preview for review
+DEFAULT_RENDITIONS = [
+    RenditionProfile("720p30", 720, 1280, 30, crf=23, preset="medium"),
+    RenditionProfile("preview", 360, 640, 30, crf=30, preset="veryfast"),
+]
+
+def rendition_path(output_video: str, profile: RenditionProfile) -> str:
+    """
+    Output path of a rendition: the main output's name with the profile name appended.
+    """
+    base, ext = os.path.splitext(output_video)
+    return f"{base}_{profile.name}{ext}"
+
+def rendition_graph(source_label: str, renditions: List[RenditionProfile]) -> Tuple[str, List[str]]:
+    """
+    Filtergraph that splits one finished (scaled, captioned) stream into the main output
+    and one scaled stream per rendition.
+
+    Returns:
+        Tuple[str, List[str]]: The filtergraph and its output labels; the first label is the
+        main output, followed by one per rendition in order.
+    """
+    count = len(renditions) + 1
+    graph = f"[{source_label}]split={count}" + "".join(f"[split{i}]" for i in range(count))
+    labels = ["split0"]
+    for i, profile in enumerate(renditions, start=1):
+        graph += f";[split{i}]{scale_crop_filter(profile.width, profile.height)},fps={profile.fps}[rendition{i}]"
+        labels.append(f"rendition{i}")
+    return graph, labels
+
+def rendition_output_args(output_video: str, renditions: List[RenditionProfile], labels: List[str], audio_map: str, desired_duration: float, audio_bitrate: str = "128k", playback_rate: float = 1.0) -> List[str]:
+    """
+    Output options for every rendition, mapping the labels from ``rendition_graph`` (minus the main one).
+    """
+    args = []
+    for profile, label in zip(renditions, labels[1:]):
+        args += [
+            '-map', f"[{label}]",
+            '-map', audio_map,
+            '-t', f"{desired_duration:.2f}",
+            '-c:v', 'libx264',
+            '-preset', profile.preset,
+            '-crf', str(profile.crf),
+            '-pix_fmt', 'yuv420p',
+            '-profile:v', 'high',
+            *playback_rate_args(playback_rate),
+            '-c:a', 'aac',
+            '-b:a', audio_bitrate,
+            rendition_path(output_video, profile)
+        ]
+    return args
+
+def escape_filter_path(path: str) -> str:
+    """
+    Escape a file path for use as a quoted filter option value (e.g. subtitles='...').
+    """
+    return path.replace("\\", "/").replace(":", "\\:")
+
+def choose_random_start(input_video: str, desired_duration: float) -> float:
+    """
+    Pick a random start time so that desired_duration seconds of input_video fit after it.
+
+    Raises:
+        ValueError: If the desired duration exceeds the video duration.
+    """
+    # Get total duration of the input video
+    try:
+        total_duration = get_video_duration(input_video)
+    except Exception as e:
+        logging.error(f"Error retrieving video duration: {e}")
+        raise e
+
+    if desired_duration > total_duration:
+        error_msg = f"Desired duration ({desired_duration}s) exceeds total video duration ({total_duration}s)."
+        logging.error(error_msg)
+        raise ValueError(error_msg)
+
+    # Choose a random start time
+    max_start = total_duration - desired_duration
+    return random.uniform(0, max_start)
+
+@timed("create_video")
+def create_video(input_video: str, output_video: str, desired_duration: float, fps: int = 24, target_width: int = 1080, target_height: int = 1920, crf: int = 20, preset: str = "slow", timeout: int = 600, start_time: Optional[float] = None, threads: Optional[int] = None, x264_params: Optional[str] = None):
     """
     Generate a video clip with the specified duration and 9:16 aspect ratio, ensuring no borders.
     Re-encodes the video to embed fps metadata and apply scaling and cropping.
@@ -80,39 +310,30 @@ def create_video(input_video: str, output_video: str, desired_duration: float, f
         crf (int, optional): Constant Rate Factor for quality (lower is better). Defaults to 20.
         preset (str, optional): Encoding preset for compression efficiency. Defaults to "slow".
         timeout (int, optional): Timeout for the FFmpeg command in seconds. Defaults to 300 (5 minutes).
+        start_time (float, optional): Start of the segment to cut, e.g. from FootageLibrary.pick_segment.
+            Skips probing the input. Defaults to a random start.
+        threads (int, optional): libx264 thread count. Defaults to FFmpeg's choice.
+        x264_params (str, optional): Extra libx264 options as "key=value:key=value". Defaults to None.
     """
     # Verify input video exists
     if not os.path.exists(input_video):
         logging.error(f"Input video does not exist: {input_video}")
         raise FileNotFoundError(f"Input video not found: {input_video}")
 
-    # Get total duration of the input video
-    try:
-        total_duration = get_video_duration(input_video)
-    except Exception as e:
-        logging.error(f"Error retrieving video duration: {e}")
-        raise e
-
-    if desired_duration > total_duration:
-        error_msg = f"Desired duration ({desired_duration}s) exceeds total video duration ({total_duration}s)."
-        logging.error(error_msg)
-        raise ValueError(error_msg)
-
-    # Choose a random start time
-    max_start = total_duration - desired_duration
-    start_sec = random.uniform(0, max_start)
+    # Choose a random start time unless the caller picked the segment
+    start_sec = start_time if start_time is not None else choose_random_start(input_video, desired_duration)
     end_sec = start_sec + desired_duration
 
-    logging.info(f"Selected random start time: {start_sec:.2f}s (End: {end_sec:.2f}s)")
+    logging.info(f"Selected start time: {start_sec:.2f}s (End: {end_sec:.2f}s)")
 
     # Define scaling and cropping filter for 9:16 aspect ratio
-    vf_filter = f"scale='if(gt(a,{target_width}/{target_height}),ceil({target_height}*a),{target_width})':'if(gt(a,{target_width}/{target_height}),{target_height},ceil({target_width}/a))', crop={target_width}:{target_height}"
+    vf_filter = scale_crop_filter(target_width, target_height)
 
     # Re-encode the video with specified fps, scaling, and cropping
     cut_cmd = [
         'ffmpeg', "-y",
+        "-ss", f"{start_sec:.2f}",   # Input seeking: jump to the (keyframe) start instead of decoding up to it
         "-i", input_video,
-        "-ss", f"{start_sec:.2f}",
         "-t", f"{desired_duration:.2f}",
         "-vf", vf_filter,            # Apply scaling and cropping
         "-c:v", "libx264",           # Re-encode video using H.264 codec
@@ -121,6 +342,7 @@ def create_video(input_video: str, output_video: str, desired_duration: float, f
         "-r", str(fps),              # Set frame rate
         "-pix_fmt", "yuv420p",       # Set pixel format
         "-profile:v", "high",        # Set H.264 profile
+        *x264_tuning_args(threads, x264_params),
         "-an",                        # Disable audio stream
         output_video
     ]
@@ -128,9 +350,9 @@ def create_video(input_video: str, output_video: str, desired_duration: float, f
 
     try:
         # Run the FFmpeg command with a timeout
-        process = subprocess.run(cut_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
-        
-        logging.info(f"FFmpeg output: {process.stdout}")
+        process = run_ffmpeg(cut_cmd, timeout=timeout, label="create_video")
+
+        logging.info(f"FFmpeg progress: {process.progress}")
         if process.stderr:
             logging.warning(f"FFmpeg warnings: {process.stderr}")
     except subprocess.TimeoutExpired:
@@ -266,7 +488,8 @@ def create_video(input_video: str, output_video: str, desired_duration: float, f
 #     os.remove(repeated_file)
 
 
-def combine_audio_video(audio_file: str, video_file: str, output_video: str, audio_bitrate: str = "128k"):
+@timed("combine_audio_video")
+def combine_audio_video(audio_file: str, video_file: str, output_video: str, audio_bitrate: str = "128k", playback_rate: float = 1.0):
     """
     Combine audio and video into a single file using FFmpeg.
 
@@ -275,6 +498,8 @@ def combine_audio_video(audio_file: str, video_file: str, output_video: str, aud
         video_file (str): Path to the input video file.
         output_video (str): Path to save the combined output video.
         audio_bitrate (str, optional): Bitrate for the audio stream. Defaults to "128k".
+        playback_rate (float, optional): Speed up (or slow down) the audio, pitch preserved,
+            as part of the AAC encode. Defaults to 1.0.
     """
     # Ensure that the input files exist
     if not os.path.exists(audio_file):
@@ -291,6 +516,7 @@ def combine_audio_video(audio_file: str, video_file: str, output_video: str, aud
         '-i', video_file,
         '-i', audio_file,
         '-c:v', 'copy',           # Copy the video stream without re-encoding
+        *playback_rate_args(playback_rate),
         '-c:a', 'aac',            # Encode audio to AAC
         '-b:a', audio_bitrate,    # Set audio bitrate
         '-strict', 'experimental',# Allow experimental codecs if necessary
@@ -302,10 +528,114 @@ def combine_audio_video(audio_file: str, video_file: str, output_video: str, aud
 
     try:
         # Run the FFmpeg command and capture output
-        process = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        logging.info(f"FFmpeg output: {process.stdout}")
+        process = run_ffmpeg(command, label="combine_audio_video")
+        logging.info(f"FFmpeg progress: {process.progress}")
         if process.stderr:
             logging.warning(f"FFmpeg warnings: {process.stderr}")
     except subprocess.CalledProcessError as e:
         logging.error(f"FFmpeg failed to combine audio and video: {e.stderr}")
-        raise e
\ No newline at end of file
+        raise e
+
+@timed("render_story")
+def render_story(input_video: str, audio_file: str, captions: List[Tuple[float, float, str]], output_video: str, desired_duration: float, fps: int = 24, target_width: int = 1080, target_height: int = 1920, crf: int = 20, preset: str = "slow", audio_bitrate: str = "128k", style: CaptionStyle = DEFAULT_CAPTION_STYLE, timeout: int = 1200, start_time: Optional[float] = None, prenormalized: bool = False, threads: Optional[int] = None, x264_params: Optional[str] = None, renditions: Optional[List[RenditionProfile]] = None, layout_size: Optional[Tuple[int, int]] = None, playback_rate: float = 1.0):
+    """
+    Produce the final captioned, narrated video in a single FFmpeg encode.
+
+    Cuts a random segment of the background video, scales and crops it to 9:16,
+    burns the captions in through libass, and muxes the narration, replacing the
+    create_video -> combine_audio_video -> moviepy caption chain and its second
+    generation of lossy encoding.
+
+    Args:
+        input_video (str): Path to the background video.
+        audio_file (str): Path to the narration audio.
+        captions (List[Tuple[float, float, str]]): (start_time, end_time, text) in seconds.
+        output_video (str): Path to save the final video.
+        desired_duration (float): Duration of the output in seconds.
+        fps (int, optional): Frames per second for the output video. Defaults to 24.
+        target_width (int, optional): Width of the output video. Defaults to 1080.
+        target_height (int, optional): Height of the output video. Defaults to 1920.
+        crf (int, optional): Constant Rate Factor for quality (lower is better). Defaults to 20.
+        preset (str, optional): Encoding preset for compression efficiency. Defaults to "slow".
+        audio_bitrate (str, optional): Bitrate for the audio stream. Defaults to "128k".
+        style (CaptionStyle, optional): Caption look. Defaults to DEFAULT_CAPTION_STYLE.
+        timeout (int, optional): Timeout for the FFmpeg command in seconds. Defaults to 1200.
+        start_time (float, optional): Start of the background segment. Defaults to a random start.
+        prenormalized (bool, optional): The input is already target_width x target_height at fps
+            (e.g. assembled by SegmentCache), so scaling, cropping and fps conversion are skipped.
+        threads (int, optional): libx264 thread count. Defaults to FFmpeg's choice.
+        x264_params (str, optional): Extra libx264 options as "key=value:key=value". Defaults to None.
+        renditions (List[RenditionProfile], optional): Extra outputs written next to output_video
+            (see ``rendition_path``). The source is decoded, scaled and captioned once and split
+            into one encoder per rendition. Defaults to None.
+        layout_size (Tuple[int, int], optional): Frame size the caption layout is designed for.
+            libass scales it to the output, so a reduced-size draft places and sizes captions
+            exactly like the full render. Defaults to the output size.
+        playback_rate (float, optional): Narration speed, applied with atempo in this encode.
+            desired_duration and the caption times must already be on the sped-up timeline
+            (see ``generate_dynamic_captions_from_words``). Defaults to 1.0.
+    """
+    if not os.path.exists(input_video):
+        logging.error(f"Input video does not exist: {input_video}")
+        raise FileNotFoundError(f"Input video not found: {input_video}")
+    if not os.path.exists(audio_file):
+        logging.error(f"Audio file does not exist: {audio_file}")
+        raise FileNotFoundError(f"Audio file not found: {audio_file}")
+    renditions = renditions or []
+
+    start_sec = start_time if start_time is not None else choose_random_start(input_video, desired_duration)
+    logging.info(f"Selected start time: {start_sec:.2f}s (End: {start_sec + desired_duration:.2f}s)")
+
+    layout_width, layout_height = layout_size or (target_width, target_height)
+    subtitle_file = write_ass_file(captions, os.path.splitext(output_video)[0] + ".ass", layout_width, layout_height, style)
+    normalize = "" if prenormalized else f"{scale_crop_filter(target_width, target_height)},fps={fps},"
+    vf_filter = (
+        f"{normalize}"
+        f"subtitles='{escape_filter_path(subtitle_file)}':fontsdir='{escape_filter_path(style.font_dir)}'"
+    )
+    if renditions:
+        # Decode, scale and caption once, then fan out to one encoder per output
+        graph, labels = rendition_graph("captioned", renditions)
+        video_args = ['-filter_complex', f"[0:v]{vf_filter}[captioned];{graph}", '-map', f"[{labels[0]}]"]
+    else:
+        labels = []
+        video_args = ['-map', '0:v:0', '-vf', vf_filter]   # Scale, crop, resample fps and burn captions
+
+    command = [
+        'ffmpeg', '-y',
+        '-ss', f"{start_sec:.2f}",   # Input seeking: skip straight to the segment
+        '-i', input_video,
+        '-i', audio_file,
+        '-t', f"{desired_duration:.2f}",
+        *video_args,
+        '-map', '1:a:0',
+        '-c:v', 'libx264',
+        '-preset', preset,
+        '-crf', str(crf),
+        '-pix_fmt', 'yuv420p',
+        '-profile:v', 'high',
+        *x264_tuning_args(threads, x264_params),
+        *playback_rate_args(playback_rate),
+        '-c:a', 'aac',
+        '-b:a', audio_bitrate,
+        output_video,
+        *rendition_output_args(output_video, renditions, labels, '1:a:0', desired_duration, audio_bitrate, playback_rate)
+    ]
+    logging.info(f"Running FFmpeg command: {' '.join(command)}")
+
+    try:
+        process = run_ffmpeg(command, timeout=timeout, label="render_story")
+        logging.info(f"FFmpeg progress: {process.progress}")
+        if process.stderr:
+            logging.warning(f"FFmpeg warnings: {process.stderr}")
+    except subprocess.TimeoutExpired:
+        logging.error(f"FFmpeg command timed out after {timeout} seconds.")
+        raise TimeoutError(f"FFmpeg command exceeded timeout of {timeout} seconds.")
+    except subprocess.CalledProcessError as e:
+        logging.error(f"FFmpeg failed to render story: {e.stderr}")
+        raise e
+    finally:
+        try:
+            os.remove(subtitle_file)
+        except OSError:
+            pass
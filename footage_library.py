@@ -0,0 +1,290 @@
+# footage_library.py
+import os
+import json
+import bisect
+import random
+import logging
+import tempfile
+import subprocess
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from constants import FOOTAGE_INDEX_PATH
+
+INDEX_VERSION = 1
+
+
+class Segment(NamedTuple):
+    path: str
+    start: float
+    duration: float
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+
+def _parse_rate(rate: str) -> float:
+    numerator, _, denominator = rate.partition("/")
+    denominator = float(denominator or 1)
+    return float(numerator) / denominator if denominator else 0.0
+
+
+def probe_footage(path: str) -> dict:
+    """
+    Probe a source video once: duration, resolution, frame rate and keyframe timestamps.
+
+    Keyframes are read from packet flags, which needs no decoding.
+
+    Args:
+        path (str): Path to the video file.
+
+    Returns:
+        dict: duration, width, height, fps and a sorted list of keyframe times in seconds.
+    """
+    info_cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height,avg_frame_rate:format=duration",
+        "-of", "json",
+        path
+    ]
+    keyframe_cmd = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        path
+    ]
+    try:
+        info = json.loads(subprocess.run(info_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, text=True).stdout)
+        packets = subprocess.run(keyframe_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, text=True).stdout
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Failed to probe footage {path}: {e.stderr}")
+        raise
+
+    keyframes = []
+    for line in packets.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(round(float(pts_time), 3))
+
+    stream = info["streams"][0]
+    return {
+        "duration": float(info["format"]["duration"]),
+        "width": int(stream["width"]),
+        "height": int(stream["height"]),
+        "fps": _parse_rate(stream.get("avg_frame_rate", "0/1")),
+        "keyframes": sorted(set(keyframes)) or [0.0],
+    }
+
+
+@contextmanager
+def _file_lock(lock_path: str):
+    """
+    Hold an exclusive lock on ``lock_path`` across processes (flock, or msvcrt on Windows).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    with open(lock_path, "a+b") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+
+            while True:
+                try:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 s; keep waiting like flock does
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class FootageLibrary:
+    """
+    Index of background footage with persisted probe metadata and usage tracking.
+
+    Every source is probed once and its metadata kept in a JSON index next to
+    the output, re-probed only when the file's size or mtime changes. Segments
+    are handed out starting on keyframes, preferring the least-used source and
+    never overlapping a segment already served from it; once no fresh footage
+    of the requested length is left, usage is reset and a new cycle begins.
+
+    Several workers may share one index. Every pick takes a lock file next to
+    the index, re-reads the usage other workers recorded, and writes its own
+    before releasing the lock, so no two workers are served overlapping footage.
+    """
+
+    def __init__(self, sources: Sequence[str], index_path: str = FOOTAGE_INDEX_PATH, rng: Optional[random.Random] = None):
+        self.sources = [os.path.abspath(source) for source in sources]
+        self.index_path = index_path
+        self.rng = rng or random.Random()
+        self._entries: Dict[str, dict] = {}
+        self._load()
+        self.refresh()
+
+    def _read_index(self) -> Dict[str, dict]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                index = json.load(index_file)
+            if index.get("version") == INDEX_VERSION:
+                return index["sources"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _load(self):
+        self._entries = self._read_index()
+
+    def _locked(self):
+        return _file_lock(self.index_path + ".lock")
+
+    def _reload_usage(self):
+        """
+        Adopt the usage other processes recorded for our sources since we last read the index.
+        """
+        on_disk = self._read_index()
+        for source in self.sources:
+            entry, disk_entry = self._entries.get(source), on_disk.get(source)
+            if entry and disk_entry and (disk_entry["size"], disk_entry["mtime"]) == (entry["size"], entry["mtime"]):
+                entry["used"] = disk_entry["used"]
+
+    def _write(self):
+        # Callers hold the lock. Entries of sources this library doesn't manage are kept.
+        index_dir = os.path.dirname(os.path.abspath(self.index_path))
+        os.makedirs(index_dir, exist_ok=True)
+        entries = self._read_index()
+        entries.update(self._entries)
+        fd, tmp_path = tempfile.mkstemp(dir=index_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as index_file:
+            json.dump({"version": INDEX_VERSION, "sources": entries}, index_file)
+        os.replace(tmp_path, self.index_path)
+
+    def save(self):
+        with self._locked():
+            self._reload_usage()
+            self._write()
+
+    def refresh(self):
+        """
+        Probe any source that is new or whose size/mtime changed since it was indexed.
+        """
+        changed = False
+        for source in self.sources:
+            if not os.path.exists(source):
+                raise FileNotFoundError(f"Input video not found: {source}")
+            stat = os.stat(source)
+            entry = self._entries.get(source)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+            logging.info(f"Indexing background footage: {source}")
+            entry = probe_footage(source)
+            entry.update(size=stat.st_size, mtime=stat.st_mtime, used=[])
+            self._entries[source] = entry
+            changed = True
+        if changed:
+            self.save()
+
+    def info(self, source: str) -> dict:
+        return self._entries[os.path.abspath(source)]
+
+    def duration(self, source: str) -> float:
+        return self.info(source)["duration"]
+
+    def usage(self, source: str) -> float:
+        """
+        Fraction of a source's footage served in the current usage cycle.
+        """
+        entry = self._entries[os.path.abspath(source)]
+        return sum(end - start for start, end in entry["used"]) / entry["duration"]
+
+    def _free_starts(self, source: str, desired_duration: float) -> List[float]:
+        entry = self._entries[source]
+        latest_start = entry["duration"] - desired_duration
+        used = sorted(entry["used"])
+        used_starts = [start for start, _ in used]
+        free = []
+        for keyframe in entry["keyframes"]:
+            if keyframe > latest_start:
+                break
+            end = keyframe + desired_duration
+            # The only used intervals that can overlap start before our end
+            position = bisect.bisect_left(used_starts, end)
+            if any(used_end > keyframe for _, used_end in used[:position]):
+                continue
+            free.append(keyframe)
+        return free
+
+    def pick_segment(self, desired_duration: float, rng: Optional[random.Random] = None) -> Segment:
+        """
+        Serve a keyframe-aligned segment that does not overlap earlier picks.
+
+        Args:
+            desired_duration (float): Length of the segment in seconds.
+            rng (random.Random, optional): Generator seeded per story so reruns choose the same
+                footage. A seeded pick depends only on the generator, the sources and their
+                keyframes: it neither avoids nor records usage, so it is the same on every run
+                and on every index. Defaults to an unseeded pick from the library's own generator.
+
+        Returns:
+            Segment: Source path, start time and duration.
+
+        Raises:
+            ValueError: If no source is long enough.
+        """
+        eligible = [s for s in self.sources if self._entries[s]["duration"] >= desired_duration]
+        if not eligible:
+            longest = max(self._entries[s]["duration"] for s in self.sources)
+            error_msg = f"Desired duration ({desired_duration}s) exceeds total video duration ({longest}s)."
+            logging.error(error_msg)
+            raise ValueError(error_msg)
+        if rng is not None:
+            return self._seeded_pick(eligible, desired_duration, rng)
+        rng = self.rng
+
+        with self._locked():
+            self._reload_usage()
+            for _ in range(2):
+                # Least-used sources first, by fraction of footage already served
+                for source in sorted(eligible, key=self.usage):
+                    starts = self._free_starts(source, desired_duration)
+                    if starts:
+                        start = rng.choice(starts)
+                        self._entries[source]["used"].append([start, start + desired_duration])
+                        self._write()
+                        return Segment(source, start, desired_duration)
+
+                logging.info("Background footage exhausted for this length; starting a new usage cycle.")
+                for source in eligible:
+                    self._entries[source]["used"] = []
+            self._write()
+
+        # Keyframes too sparse to fit the segment anywhere: fall back to an unaligned start
+        source = rng.choice(eligible)
+        start = rng.uniform(0, self._entries[source]["duration"] - desired_duration)
+        return Segment(source, start, desired_duration)
+
+    def _seeded_pick(self, eligible: List[str], desired_duration: float, rng: random.Random) -> Segment:
+        # Sorted, so the choice doesn't depend on the order sources were configured in
+        candidates = []
+        for source in sorted(eligible):
+            latest_start = self._entries[source]["duration"] - desired_duration
+            candidates.extend((source, keyframe) for keyframe in self._entries[source]["keyframes"] if keyframe <= latest_start)
+        if candidates:
+            source, start = rng.choice(candidates)
+        else:
+            source = rng.choice(sorted(eligible))
+            start = rng.uniform(0, self._entries[source]["duration"] - desired_duration)
+        return Segment(source, start, desired_duration)
@@ -0,0 +1,220 @@
+# job_queue.py
+import os
+import time
+import socket
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    story_index   INTEGER PRIMARY KEY,
+    text          TEXT NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'pending',  -- pending | leased | done | failed
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    worker        TEXT,
+    available_at  REAL NOT NULL DEFAULT 0,          -- retry backoff: not claimable before this
+    lease_expires REAL,
+    last_error    TEXT,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claimable ON jobs (status, available_at, lease_expires);
+CREATE TABLE IF NOT EXISTS stages (
+    story_index INTEGER NOT NULL,
+    stage       TEXT NOT NULL,
+    status      TEXT NOT NULL,                      -- running | done | failed
+    worker      TEXT,
+    updated_at  REAL NOT NULL,
+    PRIMARY KEY (story_index, stage)
+);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease(NamedTuple):
+    story_index: int
+    text: str
+    attempts: int
+
+
+class JobQueue:
+    """
+    A story backlog in a SQLite file that any number of worker processes, on
+    this host or others sharing the storage, can pull from without a broker.
+
+    A worker ``claim``s a story, which leases it for ``lease_seconds``, keeps
+    the lease alive with ``heartbeat`` while it works, and finishes with
+    ``complete`` or ``fail``. A failed story goes back to pending after
+    ``retry_delay`` until it has been tried ``max_attempts`` times; a story
+    whose worker died is reclaimed once its lease expires. Per-stage progress
+    is recorded in a separate table for monitoring.
+
+    Claims run in ``BEGIN IMMEDIATE`` transactions, so two workers can never
+    lease the same story. The default rollback journal relies only on file
+    locks, which is what network filesystems support; pass ``wal=True`` when
+    every worker is on the same host.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 600.0, max_attempts: int = 3, retry_delay: float = 60.0, wal: bool = False):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        connection = self._connect()
+        try:
+            if wal:
+                connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per call keeps this safe to use from threads and forked workers
+        connection = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        connection.execute("PRAGMA busy_timeout=30000")
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def enqueue(self, stories: Iterable[Tuple[int, str]]) -> int:
+        """
+        Add (story_index, text) pairs; stories already in the queue are left alone.
+
+        Returns:
+            int: Number of stories added.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs (story_index, text, updated_at) VALUES (?, ?, ?)",
+                ((story_index, text, now) for story_index, text in stories)
+            )
+            return connection.total_changes - before
+
+    def claim(self, worker: str) -> Optional[Lease]:
+        """
+        Lease the lowest-numbered claimable story: pending and past its retry
+        delay, or leased by a worker whose lease has expired.
+
+        Returns:
+            Lease: The story, or None when nothing is claimable right now.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            # A story whose workers keep dying counts against its attempts like any failure
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', last_error = 'lease expired', updated_at = :now "
+                "WHERE status = 'leased' AND lease_expires < :now AND attempts >= :max_attempts",
+                {"now": now, "max_attempts": self.max_attempts}
+            )
+            row = connection.execute(
+                """
+                SELECT story_index, text, attempts FROM jobs
+                WHERE (status = 'pending' AND available_at <= :now)
+                   OR (status = 'leased' AND lease_expires < :now)
+                ORDER BY story_index LIMIT 1
+                """,
+                {"now": now}
+            ).fetchone()
+            if row is None:
+                return None
+            story_index, text, attempts = row
+            connection.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, attempts = attempts + 1, lease_expires = ?, updated_at = ? WHERE story_index = ?",
+                (worker, now + self.lease_seconds, now, story_index)
+            )
+            return Lease(story_index, text, attempts + 1)
+
+    def heartbeat(self, story_index: int, worker: str) -> bool:
+        """
+        Extend a lease. Returns False if the lease was lost (expired and reclaimed).
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE story_index = ? AND worker = ? AND status = 'leased'",
+                (now + self.lease_seconds, now, story_index, worker)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, story_index: int, worker: str) -> bool:
+        """
+        Mark a leased story done. Returns False if the lease was lost.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'done', lease_expires = NULL, last_error = NULL, updated_at = ? WHERE story_index = ? AND worker = ? AND status = 'leased'",
+                (now, story_index, worker)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, story_index: int, worker: str, error: str) -> bool:
+        """
+        Record a failure: back to pending after ``retry_delay``, or failed for good
+        once ``max_attempts`` is reached. Returns False if the lease was lost.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                """
+                UPDATE jobs SET
+                    status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    available_at = ?, lease_expires = NULL, last_error = ?, updated_at = ?
+                WHERE story_index = ? AND worker = ? AND status = 'leased'
+                """,
+                (self.max_attempts, now + self.retry_delay, error, now, story_index, worker)
+            )
+            return cursor.rowcount == 1
+
+    def set_stage(self, story_index: int, stage: str, status: str, worker: Optional[str] = None):
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO stages (story_index, stage, status, worker, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (story_index, stage, status, worker, time.time())
+            )
+
+    def requeue_failed(self) -> int:
+        """
+        Give every permanently failed story a fresh set of attempts.
+        """
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, available_at = 0, updated_at = ? WHERE status = 'failed'",
+                (time.time(),)
+            )
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Number of stories in each status.
+        """
+        connection = self._connect()
+        try:
+            return dict(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        finally:
+            connection.close()
+
+    def has_unfinished(self) -> bool:
+        """
+        Whether any story is still pending or leased, i.e. more work may become claimable.
+        """
+        counts = self.counts()
+        return counts.get("pending", 0) + counts.get("leased", 0) > 0
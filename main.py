@@ -1,13 +1,20 @@
-import os
+import argparse
 import logging
-import subprocess
 
-from tts_utils import synthesize_speech
-from ffmpeg_utils import create_video, combine_audio_video
-from story_parser import read_stories
-from subtitle_utils import auto_caption
+from encoder_bench import load_encoder_profile
+from ffmpeg_utils import DEFAULT_RENDITIONS
+from job_queue import JobQueue, default_worker_id
+from pipeline import PipelineConfig, draft_config, promote_config, run_batch, run_worker
+from story_parser import StoryIndex
 
-def main():
+STORIES_FILE = "C:\\Users\\lisof\\Desktop\\reddit-parser\\stories.txt"
+OUTPUT_DIR = "C:\\Users\\lisof\\Desktop\\reddit-parser\\output"
+INPUT_VIDEO = "C:\\Users\\lisof\\Desktop\\reddit-parser\\videoplayback.webm"
+
+def main(first_story: int = 1, last_story: int = None, force: bool = False, profile_dir: str = None, trace_memory: bool = False, render_mode: str = "single_pass",
+         stories_file: str = STORIES_FILE, output_dir: str = OUTPUT_DIR, input_video: str = INPUT_VIDEO,
+         queue_db: str = None, enqueue: bool = False, worker_id: str = None, wait: bool = False,
+         renditions: bool = False, draft: bool = False, promote: bool = False, seed: int = None, playback_rate: float = 1.0):
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s',
@@ -17,66 +24,111 @@ def main():
         ]
     )
 
-    STORIES_FILE = "C:\\Users\\lisof\\Desktop\\reddit-parser\\stories.txt"
-    OUTPUT_DIR = "C:\\Users\\lisof\\Desktop\\reddit-parser\\output"
-    AUDIO_DIR = os.path.join(OUTPUT_DIR, "audio")
-    INPUT_VIDEO = "C:\\Users\\lisof\\Desktop\\reddit-parser\\videoplayback.webm"
-
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    os.makedirs(AUDIO_DIR, exist_ok=True)
+    queue = JobQueue(queue_db) if queue_db else None
+    if queue is None or enqueue:
+        # Byte-offset index: stories are read lazily and a rerun can resume from any story
+        stories = StoryIndex(stories_file)
+        if not len(stories):
+            logging.error("No stories found in the STORIES_FILE.")
+            return
+        last_story = min(last_story or len(stories), len(stories))
 
-    stories = read_stories(STORIES_FILE)
-    if not stories:
-        logging.error("No stories found in the STORIES_FILE.")
+    if enqueue:
+        if queue is None:
+            logging.error("--enqueue needs --queue")
+            return
+        added = queue.enqueue(zip(range(first_story, last_story + 1), stories.iter_range(first_story, last_story)))
+        logging.info(f"Enqueued {added} new stories; queue status: {queue.counts()}")
         return
 
-    for story_index, story in enumerate(stories, start=1):
-        try:
-            # Generate audio file paths
-            audio_file = os.path.join(AUDIO_DIR, f"story_{story_index}.mp3")
-            temp_video = os.path.join(OUTPUT_DIR, f"temp_story_{story_index}.mp4")
-            output_video = os.path.join(OUTPUT_DIR, f"story_{story_index}.mp4")
-
-            # Speech Synthesis
-            logging.info(f"Synthesizing speech for story {story_index}...")
-            speech_duration = synthesize_speech(story, audio_file, 'en-US-ChristopherNeural')
-            logging.info(f"Speech duration for story {story_index}: {speech_duration:.2f} seconds")
+    # Encoder settings from `python encoder_bench.py`, if it has been run on this box
+    encoder_settings = {"crf": 25, "preset": "slow"}
+    encoder_settings.update(load_encoder_profile())
 
-            # Video Creation
-            logging.info(f"Generating base video for story {story_index}...")
-            create_video(
-                input_video=INPUT_VIDEO,
-                output_video=temp_video,
-                desired_duration=speech_duration,
-                fps=60,
-                target_width=1080,
-                target_height=1920,
-                crf=25,
-                preset="slow"
-            )
-            logging.info(f"Base video created at: {temp_video}")
-
-            # Combine Audio and Video
-            logging.info(f"Combining audio and video for story {story_index}...")
-            combine_audio_video(audio_file, temp_video, output_video)
-            logging.info(f"Combined video saved at: {output_video}")
-        
-            # Add Captions
-            auto_caption(output_video)
-            logging.info(f"Video with caption saved: {output_video}")
+    config = PipelineConfig(
+        input_video=input_video,
+        output_dir=output_dir,
+        voice='en-US-ChristopherNeural',
+        fps=60,
+        target_width=1080,
+        target_height=1920,
+        render_mode=render_mode,
+        renditions=list(DEFAULT_RENDITIONS) if renditions else [],
+        force=force,
+        profile_dir=profile_dir,
+        trace_memory=trace_memory,
+        seed=seed,
+        playback_rate=playback_rate,
+        **encoder_settings
+    )
+    if draft:
+        # Low-res ultrafast review copies in <output>/drafts with the same timing, footage and layout
+        config = draft_config(config)
+    elif promote:
+        # Final render of approved drafts, reusing the footage each draft showed
+        config = promote_config(config)
+    if queue is not None:
+        # Worker mode: claim stories from the shared queue until it is drained
+        worker_id = worker_id or default_worker_id()
+        result = run_worker(queue, config, worker_id, wait=wait)
+        logging.info(f"Worker {worker_id} finished {len(result.succeeded)} stories; queue status: {queue.counts()}")
+    else:
+        result = run_batch(stories.iter_range(first_story, last_story), config, first_index=first_story)
 
-            # Remove Temporary Video
-            try:
-                os.remove(temp_video)
-                logging.info(f"Removed temporary video file for story {story_index}.")
-            except Exception as e:
-                logging.warning(f"Failed to remove temporary video file for story {story_index}: {e}")
+    if result.failed:
+        logging.warning(f"{len(result.failed)} stories failed: {sorted(result.failed)}")
+    else:
+        logging.info("All stories have been processed successfully.")
+    logging.info(f"Per-story traces in {config.trace_dir}, summary in {config.metrics_file}")
 
-        except Exception as e:
-            logging.error(f"Failed to process story {story_index}: {e}")
-            continue
+def add_run_arguments(parser: argparse.ArgumentParser):
+    """
+    The batch options, shared by ``python main.py`` and ``python cli.py run``.
+    """
+    parser.add_argument("--first", type=int, default=1, help="First story number to process")
+    parser.add_argument("--last", type=int, default=None, help="Last story number to process")
+    parser.add_argument("--force", action="store_true", help="Rebuild every stage, ignoring the build manifests")
+    parser.add_argument("--profile-dir", default=None, help="Write a cProfile .prof for every timed stage function here")
+    parser.add_argument("--trace-memory", action="store_true", help="Record tracemalloc peak memory for every timed stage function")
+    parser.add_argument("--render-mode", choices=["single_pass", "piped", "legacy"], default="single_pass",
+                        help="piped streams frames between FFmpeg processes without intermediate files")
+    parser.add_argument("--stories-file", default=STORIES_FILE, help="Story file to read")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Where videos, manifests and traces are written")
+    parser.add_argument("--input-video", default=INPUT_VIDEO, help="Background footage")
+    parser.add_argument("--queue", default=None, help="SQLite job queue shared by workers; without --enqueue, run as a worker")
+    parser.add_argument("--enqueue", action="store_true", help="Add stories --first..--last to the --queue and exit")
+    parser.add_argument("--worker-id", default=None, help="Worker name recorded on leases (default: host:pid)")
+    parser.add_argument("--wait", action="store_true", help="As a worker, keep polling for new stories once the queue is drained")
+    parser.add_argument("--renditions", action="store_true", help="Also write the 720p30 and 360p preview renditions from the same render")
+    parser.add_argument("--draft", action="store_true", help="Render fast low-res drafts for caption and timing review")
+    parser.add_argument("--promote", action="store_true", help="Render final videos with the footage chosen by their drafts")
+    parser.add_argument("--seed", type=int, default=None, help="Seed footage selection per story so reruns pick the same clips")
+    parser.add_argument("--playback-rate", type=float, default=1.0, help="Narration speed, e.g. 1.15; pitch is preserved and the video shortened to match")
 
-    logging.info("All stories have been processed successfully.")
+def main_from_args(args: argparse.Namespace):
+    # By keyword, so adding or reordering main()'s parameters can't shift the rest
+    main(
+        first_story=args.first,
+        last_story=args.last,
+        force=args.force,
+        profile_dir=args.profile_dir,
+        trace_memory=args.trace_memory,
+        render_mode=args.render_mode,
+        stories_file=args.stories_file,
+        output_dir=args.output_dir,
+        input_video=args.input_video,
+        queue_db=args.queue,
+        enqueue=args.enqueue,
+        worker_id=args.worker_id,
+        wait=args.wait,
+        renditions=args.renditions,
+        draft=args.draft,
+        promote=args.promote,
+        seed=args.seed,
+        playback_rate=args.playback_rate
+    )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Render narrated, captioned videos for every story.")
+    add_run_arguments(parser)
+    main_from_args(parser.parse_args())
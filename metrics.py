@@ -0,0 +1,236 @@
+# metrics.py
+import os
+import json
+import time
+import cProfile
+import functools
+import itertools
+import threading
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional
+
+# Profiling switches live in the environment so worker processes inherit them.
+PROFILE_DIR_ENV = "PIPELINE_PROFILE_DIR"
+TRACEMALLOC_ENV = "PIPELINE_TRACEMALLOC"
+
+
+class Trace:
+    """
+    Timings and ffmpeg progress collected for one unit of work (usually a story).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self.spans: List[dict] = []
+        self.ffmpeg: List[dict] = []
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "started_at": self.started_at, "spans": self.spans, "ffmpeg": self.ffmpeg}
+
+    def merge(self, other: dict):
+        """
+        Fold in a trace collected elsewhere, e.g. returned from a worker process.
+        """
+        self.spans.extend(other["spans"])
+        self.ffmpeg.extend(other["ffmpeg"])
+
+    def write_json(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(self.to_dict(), trace_file, indent=1)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+# Held by the span whose cProfile is running. Only one profiler can be active in a
+# process (3.12+ raises, earlier versions truncate the outer one), so nested spans
+# and spans in other threads skip profiling; the outer profile already covers them.
+_profiler_slot = threading.Lock()
+_profile_seq = itertools.count()
+# Held by the span tracking the tracemalloc peak. The peak is process-wide, so a nested
+# span resetting it would hide the outer span's allocations; only the holder resets and reads it.
+_memory_slot = threading.Lock()
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def configure(profile_dir: Optional[str] = None, trace_memory: bool = False):
+    """
+    Enable cProfile dumps (one .prof per span) and/or tracemalloc peak tracking for
+    every span in this process and in worker processes started afterwards.
+    """
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+        os.environ[PROFILE_DIR_ENV] = profile_dir
+    else:
+        os.environ.pop(PROFILE_DIR_ENV, None)
+    if trace_memory:
+        os.environ[TRACEMALLOC_ENV] = "1"
+    else:
+        os.environ.pop(TRACEMALLOC_ENV, None)
+
+
+@contextmanager
+def collecting(name: str):
+    """
+    Make a fresh Trace current for the enclosed block (and any threads it starts via
+    asyncio.to_thread, which copy the context).
+    """
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, profile: bool = False):
+    """
+    Time the enclosed block into the current trace.
+
+    Args:
+        name (str): Span name, e.g. the stage or function.
+        profile (bool, optional): Honour the cProfile/tracemalloc switches from ``configure``.
+            Only worth enabling around synchronous work, as concurrent coroutines would
+            be attributed to whichever span is open. Only the outermost profiled span
+            in a process writes a .prof and records a peak. Defaults to False.
+    """
+    trace = _current_trace.get()
+    profile_dir = os.environ.get(PROFILE_DIR_ENV) if profile else None
+    trace_memory = profile and os.environ.get(TRACEMALLOC_ENV) == "1" and _memory_slot.acquire(blocking=False)
+
+    profiler = cProfile.Profile() if profile_dir and _profiler_slot.acquire(blocking=False) else None
+    if trace_memory:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    if profiler:
+        profiler.enable()
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        record = {
+            "name": name,
+            "seconds": time.perf_counter() - started,
+            "cpu_seconds": time.process_time() - cpu_started,
+            "pid": os.getpid(),
+            "error": error,
+        }
+        if profiler:
+            profiler.disable()
+            _profiler_slot.release()
+            label = trace.name if trace else "untraced"
+            profile_path = os.path.join(profile_dir, f"{label}_{name}_{os.getpid()}_{int(time.time() * 1000)}_{next(_profile_seq)}.prof")
+            profiler.dump_stats(profile_path)
+            record["profile"] = profile_path
+        if trace_memory:
+            record["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            _memory_slot.release()
+        if trace is not None:
+            trace.spans.append(record)
+
+
+def timed(name: str):
+    """
+    Decorator form of ``span(name, profile=True)`` for synchronous stage functions.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, profile=True):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_ffmpeg(summary: dict):
+    """
+    Attach an ffmpeg run's progress summary to the current trace.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.ffmpeg.append(summary)
+
+
+def run_traced(name: str, func, *args, **kwargs):
+    """
+    Worker-process entry point: run ``func`` under its own trace and return
+    ``(result, trace_dict)`` so the parent can merge the child's spans and ffmpeg progress.
+    """
+    with collecting(name) as trace:
+        result = func(*args, **kwargs)
+    return result, trace.to_dict()
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus_summary(traces: Iterable[Trace], path: str, succeeded: int = 0, failed: int = 0):
+    """
+    Aggregate traces into a Prometheus text-format file (node_exporter textfile style).
+    """
+    runs: Dict[str, int] = defaultdict(int)
+    seconds: Dict[str, float] = defaultdict(float)
+    cpu_seconds: Dict[str, float] = defaultdict(float)
+    max_seconds: Dict[str, float] = defaultdict(float)
+    errors: Dict[str, int] = defaultdict(int)
+    encode_fps: Dict[str, List[float]] = defaultdict(list)
+    encode_speed: Dict[str, List[float]] = defaultdict(list)
+
+    for trace in traces:
+        for record in trace.spans:
+            name = record["name"]
+            runs[name] += 1
+            seconds[name] += record["seconds"]
+            cpu_seconds[name] += record["cpu_seconds"]
+            max_seconds[name] = max(max_seconds[name], record["seconds"])
+            if record["error"]:
+                errors[name] += 1
+        for run in trace.ffmpeg:
+            if run.get("fps"):
+                encode_fps[run["label"]].append(run["fps"])
+            if run.get("speed"):
+                encode_speed[run["label"]].append(run["speed"])
+
+    lines = [
+        "# HELP pipeline_stories_total Stories processed, by outcome.",
+        "# TYPE pipeline_stories_total counter",
+        f'pipeline_stories_total{{status="succeeded"}} {succeeded}',
+        f'pipeline_stories_total{{status="failed"}} {failed}',
+    ]
+    for metric, help_text, kind, values in (
+        ("pipeline_stage_runs_total", "Stage executions.", "counter", runs),
+        ("pipeline_stage_seconds_total", "Wall time spent in each stage.", "counter", seconds),
+        ("pipeline_stage_cpu_seconds_total", "CPU time of the process running each stage.", "counter", cpu_seconds),
+        ("pipeline_stage_seconds_max", "Slowest single execution of each stage.", "gauge", max_seconds),
+        ("pipeline_stage_errors_total", "Stage executions that raised.", "counter", errors),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        lines += [f'{metric}{{stage="{_escape_label(name)}"}} {value:g}' for name, value in sorted(values.items())]
+    for metric, help_text, samples in (
+        ("pipeline_ffmpeg_fps_avg", "Average final encode fps reported by ffmpeg -progress.", encode_fps),
+        ("pipeline_ffmpeg_speed_avg", "Average final encode speed (x realtime) reported by ffmpeg -progress.", encode_speed),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        lines += [f'{metric}{{command="{_escape_label(name)}"}} {sum(v) / len(v):g}' for name, v in sorted(samples.items())]
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as prom_file:
+        prom_file.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
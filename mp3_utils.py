@@ -0,0 +1,310 @@
+# mp3_utils.py
+import os
+from typing import List, NamedTuple, Optional, Tuple
+
+# Bitrates in kbps indexed by [version is MPEG-1][layer][bitrate index]
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates indexed by the two version bits (0 = MPEG-2.5, 2 = MPEG-2, 3 = MPEG-1)
+_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
+_HEADER_SIZE = 4
+
+
+class FrameHeader:
+    """
+    A decoded MPEG audio frame header.
+    """
+    __slots__ = ("mpeg1", "layer", "sample_rate", "samples", "length", "mono")
+
+    def __init__(self, mpeg1: bool, layer: int, sample_rate: int, samples: int, length: int, mono: bool):
+        self.mpeg1 = mpeg1
+        self.layer = layer
+        self.sample_rate = sample_rate
+        self.samples = samples
+        self.length = length
+        self.mono = mono
+
+
+def parse_frame_header(data, pos: int = 0) -> Optional[FrameHeader]:
+    """
+    Decode the 4-byte frame header at ``data[pos:]``.
+
+    Returns:
+        Optional[FrameHeader]: The header, or None if the bytes are not a valid header
+        (including free-format frames, whose length cannot be known from the header).
+    """
+    if len(data) - pos < _HEADER_SIZE:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    layer = 4 - ((b1 >> 1) & 0x03)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    mono = (b3 >> 6) == 3
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return FrameHeader(mpeg1, layer, sample_rate, samples, length, mono)
+
+
+def _id3v2_size(data) -> Optional[int]:
+    """
+    Total size of an ID3v2 tag at the start of ``data``, 0 if there is none, or None
+    if more bytes are needed to tell.
+    """
+    if len(data) < 10:
+        return None if data[:3] == b"ID3"[:len(data)] else 0
+    if data[:3] != b"ID3":
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _side_info_size(header: FrameHeader) -> int:
+    if header.mpeg1:
+        return 17 if header.mono else 32
+    return 9 if header.mono else 17
+
+
+def read_info_frame(buffer, pos: int, header: FrameHeader) -> Optional[Tuple[Optional[int], int, int]]:
+    """
+    Parse a Xing/Info or VBRI header in the frame at ``buffer[pos:]``.
+
+    Returns:
+        Optional[Tuple[Optional[int], int, int]]: (declared frame count, encoder delay,
+        encoder padding) if the frame is a metadata frame rather than audio, else None.
+    """
+    xing = pos + _HEADER_SIZE + _side_info_size(header)
+    tag = bytes(buffer[xing:xing + 4])
+    if tag in (b"Xing", b"Info"):
+        header_frames, delay, padding = None, 0, 0
+        flags = int.from_bytes(buffer[xing + 4:xing + 8], "big")
+        cursor = xing + 8
+        if flags & 0x1:
+            header_frames = int.from_bytes(buffer[cursor:cursor + 4], "big")
+            cursor += 4
+        if flags & 0x2:
+            cursor += 4
+        if flags & 0x4:
+            cursor += 100
+        if flags & 0x8:
+            cursor += 4
+        # LAME extension: 9-byte encoder string, then delay/padding 12 bits each at +21
+        if bytes(buffer[cursor:cursor + 4]) in (b"LAME", b"Lavf", b"Lavc"):
+            gapless = buffer[cursor + 21:cursor + 24]
+            if len(gapless) == 3:
+                delay = (gapless[0] << 4) | (gapless[1] >> 4)
+                padding = ((gapless[1] & 0x0F) << 8) | gapless[2]
+        return header_frames, delay, padding
+    vbri = pos + _HEADER_SIZE + 32
+    if bytes(buffer[vbri:vbri + 4]) == b"VBRI":
+        delay = int.from_bytes(buffer[vbri + 6:vbri + 8], "big")
+        header_frames = int.from_bytes(buffer[vbri + 14:vbri + 18], "big")
+        return header_frames, delay, 0
+    return None
+
+
+class Mp3FrameCounter:
+    """
+    Incrementally counts MPEG audio frames from a byte stream without decoding.
+
+    Feed it the bytes of an MP3 as they are written (or read) and ask for the
+    duration at any point. A leading ID3v2 tag is skipped, a Xing/Info or VBRI
+    header frame is honoured (and not counted as audio), and LAME encoder delay
+    and padding are subtracted when present, so the result is sample-accurate
+    for gapless encodes.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._skip: Optional[int] = None
+        self._first_frame = True
+        self.frames = 0
+        self.samples = 0
+        self.sample_rate = 0
+        self.header_frames: Optional[int] = None
+        self.encoder_delay = 0
+        self.encoder_padding = 0
+
+    def feed(self, data: bytes):
+        self._buffer += data
+        if self._skip is None:
+            self._skip = _id3v2_size(self._buffer)
+            if self._skip is None:
+                return
+        if self._skip:
+            dropped = min(self._skip, len(self._buffer))
+            del self._buffer[:dropped]
+            self._skip -= dropped
+            if self._skip:
+                return
+        self._consume()
+
+    def _consume(self):
+        buffer = self._buffer
+        pos = 0
+        while True:
+            header = parse_frame_header(buffer, pos)
+            if header is None:
+                if len(buffer) - pos < _HEADER_SIZE:
+                    break
+                # Lost sync (junk or a trailing tag): scan forward to the next candidate
+                next_sync = buffer.find(b"\xff", pos + 1)
+                pos = next_sync if next_sync != -1 else len(buffer)
+                continue
+            if len(buffer) - pos < header.length:
+                break
+            if self._first_frame:
+                self._first_frame = False
+                self.sample_rate = header.sample_rate
+                if self._read_info_frame(buffer, pos, header):
+                    pos += header.length
+                    continue
+            self.frames += 1
+            self.samples += header.samples
+            pos += header.length
+        del buffer[:pos]
+
+    def _read_info_frame(self, buffer, pos: int, header: FrameHeader) -> bool:
+        """
+        Parse a Xing/Info or VBRI header in the first frame. Returns True if the
+        frame is a metadata frame rather than audio.
+        """
+        info = read_info_frame(buffer, pos, header)
+        if info is None:
+            return False
+        self.header_frames, self.encoder_delay, self.encoder_padding = info
+        return True
+
+    def samples_per_frame(self) -> int:
+        return self.samples // self.frames if self.frames else 0
+
+    def duration(self) -> float:
+        """
+        Duration in seconds of everything fed so far (or of the whole file, if a
+        Xing/VBRI header declared the frame count).
+        """
+        if not self.sample_rate:
+            return 0.0
+        samples = self.samples
+        if self.header_frames is not None and self.frames:
+            samples = self.header_frames * self.samples_per_frame()
+        samples -= self.encoder_delay + self.encoder_padding
+        return max(samples, 0) / self.sample_rate
+
+
+def probe_mp3_duration(path: str, chunk_size: int = 64 * 1024) -> float:
+    """
+    Compute the duration of an MP3 file from its frame headers, without decoding.
+
+    If the first frame is a Xing/Info or VBRI header that declares the frame count,
+    only the beginning of the file is read. Otherwise every frame header is walked.
+
+    Args:
+        path (str): Path to the MP3 file.
+        chunk_size (int, optional): Read size in bytes. Defaults to 64 KiB.
+
+    Returns:
+        float: Duration in seconds.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+        ValueError: If no MPEG audio frames were found.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Audio file not found: {path}")
+
+    counter = Mp3FrameCounter()
+    with open(path, "rb") as audio:
+        while True:
+            chunk = audio.read(chunk_size)
+            if not chunk:
+                break
+            counter.feed(chunk)
+            if counter.header_frames is not None and counter.frames:
+                break
+
+    if not counter.sample_rate:
+        raise ValueError(f"No MPEG audio frames found in {path}")
+    return counter.duration()
+
+
+class AudioFrames(NamedTuple):
+    """
+    The audio frames of an MP3, with the encoder's gapless metadata.
+    """
+    data: bytes
+    samples: int           # Every sample the frames decode to, priming and padding included
+    sample_rate: int
+    encoder_delay: int     # Priming samples at the start, from the Xing/Info or VBRI header
+    encoder_padding: int   # Padding samples at the end, likewise
+
+
+def audio_frames(data: bytes) -> AudioFrames:
+    """
+    Strip a complete MP3 down to its audio frames.
+
+    The leading ID3v2 tag, a Xing/Info or VBRI header frame and anything that is
+    not a frame (such as a trailing ID3v1 tag) are dropped, so the frames of
+    several files encoded with the same settings can be joined byte for byte
+    into one stream without re-encoding. The header frame's encoder delay and
+    padding are returned rather than applied: the frames still decode to those
+    samples, and a caller joining files has to account for them itself.
+
+    Returns:
+        AudioFrames: The frames, their total sample count, the sample rate and
+        the encoder delay and padding (0 without a header frame).
+    """
+    pos = _id3v2_size(data) or 0
+    kept: List[bytes] = []
+    samples = 0
+    sample_rate = 0
+    delay = padding = 0
+    while True:
+        header = parse_frame_header(data, pos)
+        if header is None:
+            if len(data) - pos < _HEADER_SIZE:
+                break
+            next_sync = data.find(b"\xff", pos + 1)
+            pos = next_sync if next_sync != -1 else len(data)
+            continue
+        if len(data) - pos < header.length:
+            break
+        if not sample_rate:
+            sample_rate = header.sample_rate
+            info = read_info_frame(data, pos, header)
+            if info is not None:
+                _, delay, padding = info
+                pos += header.length
+                continue
+        kept.append(data[pos:pos + header.length])
+        samples += header.samples
+        pos += header.length
+    return AudioFrames(b"".join(kept), samples, sample_rate, delay, padding)
@@ -0,0 +1,182 @@
+# pipe_render.py
+import os
+import logging
+import threading
+import subprocess
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from caption_style import DEFAULT_CAPTION_STYLE, CaptionStyle
+from caption_track import CaptionTrack
+from ffmpeg_utils import RenditionProfile, choose_random_start, playback_rate_args, rendition_graph, rendition_output_args, scale_crop_filter, x264_tuning_args
+from metrics import timed
+from segment_cache import SegmentCache
+
+
+def _drain(stream, chunks: List[bytes]):
+    chunks.append(stream.read())
+
+
+@timed("render_story_piped")
+def render_story_piped(input_video: str, audio_file: str, captions: List[Tuple[float, float, str]], output_video: str, desired_duration: float, fps: int = 24, target_width: int = 1080, target_height: int = 1920, crf: int = 20, preset: str = "slow", audio_bitrate: str = "128k", style: CaptionStyle = DEFAULT_CAPTION_STYLE, timeout: int = 1200, start_time: Optional[float] = None, segment_cache: Optional[SegmentCache] = None, threads: Optional[int] = None, x264_params: Optional[str] = None, renditions: Optional[List[RenditionProfile]] = None, playback_rate: float = 1.0):
+    """
+    Render a captioned story with the stages connected by pipes instead of files.
+
+    A decoding FFmpeg cuts, scales and crops the background to raw RGB frames on
+    its stdout; captions are alpha-blended onto each frame in Python from the
+    cached Pillow sprites; and an encoding FFmpeg reads the frames on its stdin,
+    muxes the narration and writes the final video. No base video, muxed video,
+    extracted audio or subtitle file is written, so scratch disk per story is
+    only what the encoder's output needs.
+
+    Args:
+        input_video (str): Path to the background video.
+        audio_file (str): Path to the narration audio.
+        captions (List[Tuple[float, float, str]]): (start_time, end_time, text) in seconds.
+        output_video (str): Path to save the final video.
+        desired_duration (float): Duration of the output in seconds.
+        fps (int, optional): Frames per second for the output video. Defaults to 24.
+        target_width (int, optional): Width of the output video. Defaults to 1080.
+        target_height (int, optional): Height of the output video. Defaults to 1920.
+        crf (int, optional): Constant Rate Factor for quality (lower is better). Defaults to 20.
+        preset (str, optional): Encoding preset for compression efficiency. Defaults to "slow".
+        audio_bitrate (str, optional): Bitrate for the audio stream. Defaults to "128k".
+        style (CaptionStyle, optional): Caption look. Defaults to DEFAULT_CAPTION_STYLE.
+        timeout (int, optional): Timeout for the whole render in seconds. Defaults to 1200.
+        start_time (float, optional): Start of the background segment. Defaults to a random start.
+        segment_cache (SegmentCache, optional): Prepared segments of input_video; the decoder then
+            concat-demuxes them directly and skips scaling. Defaults to None.
+        threads (int, optional): libx264 thread count. Defaults to FFmpeg's choice.
+        x264_params (str, optional): Extra libx264 options as "key=value:key=value". Defaults to None.
+        renditions (List[RenditionProfile], optional): Extra outputs; the encoder splits the
+            captioned frames into one encode per rendition. Defaults to None.
+        playback_rate (float, optional): Narration speed, applied with atempo by the encoder;
+            desired_duration and captions are on the sped-up timeline. Defaults to 1.0.
+    """
+    if not os.path.exists(input_video):
+        logging.error(f"Input video does not exist: {input_video}")
+        raise FileNotFoundError(f"Input video not found: {input_video}")
+    if not os.path.exists(audio_file):
+        logging.error(f"Audio file does not exist: {audio_file}")
+        raise FileNotFoundError(f"Audio file not found: {audio_file}")
+
+    list_file = None
+    if segment_cache is not None:
+        # A few lines of text; the footage itself is read straight from the segments
+        list_file = os.path.splitext(output_video)[0] + "_segments.txt"
+        start_sec = segment_cache.write_concat_list(list_file, desired_duration, start_time)
+        source_args = ['-f', 'concat', '-safe', '0', '-i', list_file]
+        filter_args = []
+    else:
+        start_sec = start_time if start_time is not None else choose_random_start(input_video, desired_duration)
+        source_args = ['-ss', f"{start_sec:.2f}", '-i', input_video]
+        filter_args = ['-vf', f"{scale_crop_filter(target_width, target_height)},fps={fps}"]
+    logging.info(f"Selected start time: {start_sec:.2f}s (End: {start_sec + desired_duration:.2f}s)")
+
+    renditions = renditions or []
+    if renditions:
+        graph, labels = rendition_graph("0:v", renditions)
+        video_map = ['-filter_complex', graph, '-map', f"[{labels[0]}]"]
+    else:
+        labels = []
+        video_map = ['-map', '0:v:0']
+
+    decode_cmd = [
+        'ffmpeg', '-v', 'error',
+        *source_args,
+        '-t', f"{desired_duration:.2f}",
+        *filter_args,
+        '-an',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'rgb24',
+        'pipe:1'
+    ]
+    encode_cmd = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'rgb24',
+        '-s', f"{target_width}x{target_height}",
+        '-r', str(fps),
+        '-i', 'pipe:0',
+        '-i', audio_file,
+        '-t', f"{desired_duration:.2f}",
+        *video_map,
+        '-map', '1:a:0',
+        '-c:v', 'libx264',
+        '-preset', preset,
+        '-crf', str(crf),
+        '-pix_fmt', 'yuv420p',
+        '-profile:v', 'high',
+        *x264_tuning_args(threads, x264_params),
+        *playback_rate_args(playback_rate),
+        '-c:a', 'aac',
+        '-b:a', audio_bitrate,
+        output_video,
+        *rendition_output_args(output_video, renditions, labels, '1:a:0', desired_duration, audio_bitrate, playback_rate)
+    ]
+    logging.info(f"Running FFmpeg decoder: {' '.join(decode_cmd)}")
+    logging.info(f"Running FFmpeg encoder: {' '.join(encode_cmd)}")
+
+    track = CaptionTrack(captions, target_width, target_height, style)
+    frame_size = target_width * target_height * 3
+    buffer = bytearray(frame_size)
+    frame = np.frombuffer(buffer, dtype=np.uint8).reshape(target_height, target_width, 3)
+
+    decoder = subprocess.Popen(decode_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    encoder = subprocess.Popen(encode_cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    decode_errors, encode_errors = [], []
+    readers = [
+        threading.Thread(target=_drain, args=(decoder.stderr, decode_errors), daemon=True),
+        threading.Thread(target=_drain, args=(encoder.stderr, encode_errors), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    timed_out = threading.Event()
+    def kill():
+        timed_out.set()
+        decoder.kill()
+        encoder.kill()
+    watchdog = threading.Timer(timeout, kill)
+    watchdog.start()
+
+    frames = 0
+    encoder_closed = False
+    try:
+        try:
+            while decoder.stdout.readinto(buffer) == frame_size:
+                track.composite(frame, frames / fps)
+                encoder.stdin.write(buffer)
+                frames += 1
+        except BrokenPipeError:
+            # The encoder stopped reading: it either reached -t or failed, which its status says
+            encoder_closed = True
+        finally:
+            try:
+                encoder.stdin.close()
+            except BrokenPipeError:
+                pass
+            decoder.stdout.close()
+        decoder.wait()
+        encoder.wait()
+    finally:
+        watchdog.cancel()
+        for reader in readers:
+            reader.join()
+        if list_file and os.path.exists(list_file):
+            os.remove(list_file)
+
+    if timed_out.is_set():
+        logging.error(f"FFmpeg pipeline timed out after {timeout} seconds.")
+        raise TimeoutError(f"FFmpeg pipeline exceeded timeout of {timeout} seconds.")
+    if encoder.returncode != 0:
+        stderr = b"".join(encode_errors).decode("utf-8", "replace")
+        logging.error(f"FFmpeg failed to encode piped frames: {stderr}")
+        raise subprocess.CalledProcessError(encoder.returncode, encode_cmd, stderr=stderr)
+    # Closing the decoder's stdout early kills it with SIGPIPE, which is expected then
+    if decoder.returncode != 0 and not encoder_closed:
+        stderr = b"".join(decode_errors).decode("utf-8", "replace")
+        logging.error(f"FFmpeg failed to decode background video: {stderr}")
+        raise subprocess.CalledProcessError(decoder.returncode, decode_cmd, stderr=stderr)
+    logging.info(f"Piped {frames} frames into {output_video}")
@@ -0,0 +1,730 @@
+# pipeline.py
+import os
+import random
+import asyncio
+import functools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+from audio_mix import mix_audio, needs_music, prepare_music_bed
+from build_manifest import StoryManifest, file_identity, fingerprint
+from footage_library import FootageLibrary, Segment
+from job_queue import JobQueue
+from segment_cache import SegmentCache
+from tts_cache import TTSCache
+from transcript_cache import TranscriptCache
+from word_timings import Word, to_words
+from constants import FOOTAGE_INDEX_PATH, TRANSCRIPT_CACHE_DIR, TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES
+from ffmpeg_utils import RenditionProfile, create_video, combine_audio_video, render_story, rendition_path
+from subtitle_utils import (
+    add_quick_captions_to_video_with_music,
+    generate_dynamic_captions_from_words,
+)
+
+if TYPE_CHECKING:
+    from transcription import TranscriptionBackend
+
+
+def _default_workers() -> int:
+    # x264 is already multi-threaded, so half the cores keeps the encoders busy
+    # without oversubscribing the machine.
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+@dataclass
+class PipelineConfig:
+    """
+    Settings for a batch run. Stage pool sizes bound how much work of each kind
+    runs at once; ``max_in_flight`` bounds how many stories are admitted at all.
+    """
+    input_video: str
+    output_dir: str
+    # Extra background sources served alongside input_video by the footage library
+    footage_sources: List[str] = field(default_factory=list)
+    footage_index_path: str = FOOTAGE_INDEX_PATH
+    # Transcode each source once into closed-GOP segments and stream-copy base videos from them
+    prenormalized_footage: bool = False
+    segment_seconds: float = 2.0
+    voice: str = "en-US-ChristopherNeural"
+    fps: int = 60
+    target_width: int = 1080
+    target_height: int = 1920
+    crf: int = 25
+    preset: str = "slow"
+    threads: Optional[int] = None
+    x264_params: Optional[str] = None
+    background_music: str = "./background.mp3"
+    # Linear music volume; 0 skips the music (no decode, no mix)
+    music_gain: float = 0.0
+    music_ducking: bool = False
+    # "single_pass" renders cut, captions and narration in one ffmpeg encode;
+    # "piped" streams decoded frames through Python captioning into the encoder with no
+    # intermediate files; "legacy" runs create_video, combine_audio_video and the moviepy caption pass.
+    render_mode: str = "single_pass"
+    # Extra outputs split from the same decode and caption pass (single_pass and piped modes)
+    renditions: List[RenditionProfile] = field(default_factory=list)
+    # Stories synthesizing at once; their edge-tts connections are capped by tts_utils.TTS_MAX_CONNECTIONS
+    tts_concurrency: int = 8
+    tts_retries: int = 3
+    tts_rate: str = "+0%"
+    tts_pitch: str = "+0Hz"
+    # Narration speed in the video, applied with pitch-preserving atempo in the final mux/render
+    playback_rate: float = 1.0
+    # Longer stories are synthesized as concurrent sentence-aligned chunks of at most this many characters
+    tts_chunk_chars: int = 1000
+    tts_cache_dir: Optional[str] = TTS_CACHE_DIR
+    tts_cache_max_bytes: int = TTS_CACHE_MAX_BYTES
+    transcript_cache_dir: Optional[str] = TRANSCRIPT_CACHE_DIR
+    # "assemblyai", or "stub" for offline runs
+    transcription_backend: str = "assemblyai"
+    transcribe_concurrency: int = 8
+    render_workers: int = field(default_factory=_default_workers)
+    caption_workers: int = field(default_factory=_default_workers)
+    max_in_flight: Optional[int] = None
+    # Rebuild every stage even when the build manifest says it is up to date
+    force: bool = False
+    # Dump a cProfile .prof per timed function here, and/or record tracemalloc peaks
+    profile_dir: Optional[str] = None
+    trace_memory: bool = False
+    # Seed footage selection per story so reruns pick the same clips
+    seed: Optional[int] = None
+    # Frame size the captions are laid out for, when rendering smaller than that (drafts)
+    layout_width: Optional[int] = None
+    layout_height: Optional[int] = None
+    # Manifests of an approved draft run: reuse each story's footage segment from there
+    segment_plan_dir: Optional[str] = None
+
+    @property
+    def audio_dir(self) -> str:
+        return os.path.join(self.output_dir, "audio")
+
+    @property
+    def manifest_dir(self) -> str:
+        return os.path.join(self.output_dir, "manifests")
+
+    @property
+    def trace_dir(self) -> str:
+        return os.path.join(self.output_dir, "traces")
+
+    @property
+    def metrics_file(self) -> str:
+        return os.path.join(self.output_dir, "metrics.prom")
+
+    @property
+    def layout_size(self) -> Tuple[int, int]:
+        return (self.layout_width or self.target_width, self.layout_height or self.target_height)
+
+    def admission_limit(self) -> int:
+        if self.max_in_flight:
+            return self.max_in_flight
+        # Enough stories to keep every stage busy plus one queued job per worker.
+        return self.tts_concurrency + 2 * (self.render_workers + self.caption_workers)
+
+
+@dataclass
+class BatchResult:
+    succeeded: List[int] = field(default_factory=list)
+    failed: Dict[int, str] = field(default_factory=dict)
+
+
+def draft_config(config: PipelineConfig, height: int = 640, fps: int = 30) -> PipelineConfig:
+    """
+    A cheap review version of ``config``: same stories, narration, caption timing and
+    layout, rendered at reduced size and frame rate with ultrafast x264 into
+    ``<output_dir>/drafts``. Captions are burned in by libass during the one encode
+    and laid out at the full-size frame, then scaled, so they sit exactly where the
+    final render puts them.
+    """
+    scale = height / config.target_height
+    width = int(round(config.target_width * scale / 2)) * 2  # x264 needs even dimensions
+    return replace(
+        config,
+        output_dir=os.path.join(config.output_dir, "drafts"),
+        # Drafts keep their own usage record so reviewing doesn't use up footage for the finals
+        footage_index_path=os.path.join(config.output_dir, "drafts", "footage_index.json"),
+        target_width=width,
+        target_height=height,
+        fps=min(fps, config.fps),
+        crf=30,
+        preset="ultrafast",
+        threads=None,
+        x264_params=None,
+        render_mode="single_pass",
+        prenormalized_footage=False,
+        renditions=[],
+        seed=0 if config.seed is None else config.seed,
+        layout_width=config.target_width,
+        layout_height=config.target_height,
+        segment_plan_dir=None,
+    )
+
+
+def promote_config(config: PipelineConfig) -> PipelineConfig:
+    """
+    The final-render version of ``config`` that reuses each story's footage segment
+    from its approved draft (see ``draft_config``), so the final video matches the
+    draft the reviewer signed off on.
+    """
+    return replace(config, segment_plan_dir=draft_config(config).manifest_dir)
+
+
+# Stage dependency graphs per render mode; the last stage listed is the story's final output.
+STAGE_DEPENDENCIES = {
+    "single_pass": {
+        "tts": [],
+        "words": ["tts"],
+        "mix": ["tts"],
+        "render": ["mix", "words"],
+    },
+    "piped": {
+        "tts": [],
+        "words": ["tts"],
+        "mix": ["tts"],
+        "render": ["mix", "words"],
+    },
+    "legacy": {
+        "tts": [],
+        "words": ["tts"],
+        "mix": ["tts"],
+        "base": ["tts"],
+        "mux": ["mix", "base"],
+        "caption": ["mux", "words"],
+    },
+}
+
+
+@dataclass
+class StoryJob:
+    index: int
+    text: str
+    audio_file: str
+    temp_video: str
+    output_video: str
+    captioned_video: str
+    manifest: StoryManifest
+    keys: Dict[str, str]
+    params: Dict[str, dict]
+    done: set = field(default_factory=set)
+
+
+def _build_base_video(config: PipelineConfig, temp_video: str, segment: Segment, segment_cache: Optional[SegmentCache] = None):
+    """
+    Worker-process entry point: cut (or assemble) the background clip.
+    """
+    if segment_cache is not None:
+        segment_cache.assemble(temp_video, segment.duration, start_time=segment.start)
+    else:
+        create_video(
+            input_video=segment.path,
+            output_video=temp_video,
+            desired_duration=segment.duration,
+            start_time=segment.start,
+            fps=config.fps,
+            target_width=config.target_width,
+            target_height=config.target_height,
+            crf=config.crf,
+            preset=config.preset,
+            threads=config.threads,
+            x264_params=config.x264_params
+        )
+
+
+def _mux_narration(audio_file: str, temp_video: str, output_video: str, playback_rate: float = 1.0):
+    """
+    Worker-process entry point: mux the narration into the base video and drop the base video.
+    """
+    combine_audio_video(audio_file, temp_video, output_video, playback_rate=playback_rate)
+    try:
+        os.remove(temp_video)
+    except OSError as e:
+        logging.warning(f"Failed to remove temporary video file {temp_video}: {e}")
+
+
+def _render_final_video(config: PipelineConfig, audio_file: str, captions, temp_video: str, output_video: str, segment: Segment, segment_cache: Optional[SegmentCache] = None, playback_rate: float = 1.0):
+    """
+    Worker-process entry point: single-pass cut, caption and mux.
+
+    ``playback_rate`` is whatever speed-up ``audio_file`` still needs; a music mix has already applied it.
+    """
+    if config.render_mode == "piped":
+        from pipe_render import render_story_piped  # numpy frame compositing, only in piped mode
+
+        render_story_piped(
+            input_video=segment.path,
+            start_time=segment.start,
+            segment_cache=segment_cache,
+            audio_file=audio_file,
+            captions=captions,
+            output_video=output_video,
+            desired_duration=segment.duration,
+            fps=config.fps,
+            target_width=config.target_width,
+            target_height=config.target_height,
+            crf=config.crf,
+            preset=config.preset,
+            threads=config.threads,
+            x264_params=config.x264_params,
+            renditions=config.renditions,
+            playback_rate=playback_rate
+        )
+        return
+
+    input_video, start_time = segment.path, segment.start
+    if segment_cache is not None:
+        # Stream-copy the normalized segments so the encode skips decode-and-scale of the source
+        segment_cache.assemble(temp_video, segment.duration, start_time=segment.start)
+        input_video, start_time = temp_video, 0.0
+    try:
+        render_story(
+            input_video=input_video,
+            start_time=start_time,
+            prenormalized=segment_cache is not None,
+            audio_file=audio_file,
+            captions=captions,
+            output_video=output_video,
+            desired_duration=segment.duration,
+            fps=config.fps,
+            target_width=config.target_width,
+            target_height=config.target_height,
+            crf=config.crf,
+            preset=config.preset,
+            threads=config.threads,
+            x264_params=config.x264_params,
+            renditions=config.renditions,
+            layout_size=config.layout_size,
+            playback_rate=playback_rate
+        )
+    finally:
+        if segment_cache is not None and os.path.exists(temp_video):
+            os.remove(temp_video)
+
+
+class BatchRunner:
+    """
+    Runs the story pipeline with the stages overlapped across stories.
+
+    TTS and transcription are network-bound and run as coroutines on one event
+    loop. Captions are normally timed from the WordBoundary events edge-tts
+    streams, so transcription is only a fallback; when needed, every story's
+    job shares one TranscriptionBackend and therefore one polling loop.
+    The ffmpeg and moviepy stages are CPU-bound and run in process pools.
+    Stories are pulled from the input lazily and only admitted while fewer
+    than ``admission_limit()`` are in flight, so a slow stage pushes back on
+    the ones before it instead of piling up finished audio on disk.
+
+    Every stage is recorded in a per-story StoryManifest. A story's final stage
+    is built on demand, make-style: a stage whose key (its parameters plus the
+    keys of its dependencies) and outputs are unchanged is skipped, and its
+    dependencies are only visited when it has to run. ``config.force`` rebuilds
+    everything.
+
+    Each story runs under a metrics trace: every stage is a span, worker
+    processes send back their own spans and ffmpeg progress, and the trace is
+    written to ``traces/story_N.json``. A Prometheus-text summary of the whole
+    batch is written to ``metrics.prom`` at the end.
+    """
+
+    def __init__(self, config: PipelineConfig):
+        self.config = config
+        self.result = BatchResult()
+        self.traces: List[metrics.Trace] = []
+        self.tts_cache = TTSCache(config.tts_cache_dir, config.tts_cache_max_bytes) if config.tts_cache_dir else None
+        self.transcript_cache = TranscriptCache(config.transcript_cache_dir) if config.transcript_cache_dir else None
+        self.footage = FootageLibrary([config.input_video, *config.footage_sources], config.footage_index_path)
+        self.segment_caches: Dict[str, SegmentCache] = {}
+        self._transcriber: Optional["TranscriptionBackend"] = None
+        # Set by run_queue
+        self.queue: Optional[JobQueue] = None
+        self.worker: Optional[str] = None
+        if config.prenormalized_footage:
+            for source in self.footage.sources:
+                self.segment_caches[source] = SegmentCache(
+                    source, config.fps, config.target_width, config.target_height,
+                    config.crf, config.preset, config.segment_seconds
+                )
+        self.dependencies = STAGE_DEPENDENCIES[config.render_mode]
+        if config.renditions and config.render_mode == "legacy":
+            logging.warning("Renditions are only rendered in the single_pass and piped modes; ignoring them.")
+        self.stages = {
+            "tts": self._stage_tts,
+            "words": self._stage_words,
+            "mix": self._stage_mix,
+            "base": self._stage_base,
+            "mux": self._stage_mux,
+            "caption": self._stage_caption,
+            "render": self._stage_render,
+        }
+
+    async def run(self, stories: Iterable[str], first_index: int = 1) -> BatchResult:
+        async def numbered():
+            for story_index, story in enumerate(stories, start=first_index):
+                yield story_index, story
+        return await self._run(numbered())
+
+    async def run_queue(self, queue: JobQueue, worker: str, wait: bool = False, poll_interval: float = 10.0) -> BatchResult:
+        """
+        Process stories claimed from a shared JobQueue until it has nothing left for this worker.
+
+        Args:
+            queue (JobQueue): The shared backlog.
+            worker (str): This worker's id, recorded on its leases.
+            wait (bool, optional): Keep polling for new stories instead of returning once
+                nothing is pending or leased. Defaults to False.
+            poll_interval (float, optional): Seconds between claims while the queue has
+                nothing claimable. Defaults to 10.
+        """
+        self.queue, self.worker = queue, worker
+
+        async def claimed():
+            while True:
+                lease = await asyncio.to_thread(queue.claim, worker)
+                if lease is not None:
+                    logging.info(f"Claimed story {lease.story_index} (attempt {lease.attempts})")
+                    yield lease.story_index, lease.text
+                elif wait or await asyncio.to_thread(queue.has_unfinished):
+                    # Retries and other workers' expired leases become claimable later
+                    await asyncio.sleep(poll_interval)
+                else:
+                    return
+        return await self._run(claimed())
+
+    async def _run(self, stories: AsyncIterator[Tuple[int, str]]) -> BatchResult:
+        os.makedirs(self.config.output_dir, exist_ok=True)
+        os.makedirs(self.config.audio_dir, exist_ok=True)
+
+        self._tts_slots = asyncio.Semaphore(self.config.tts_concurrency)
+        admission = asyncio.Semaphore(self.config.admission_limit())
+        pending = set()
+        # Before the pools start, so workers inherit the profiling switches
+        metrics.configure(self.config.profile_dir, self.config.trace_memory)
+
+        with ProcessPoolExecutor(max_workers=self.config.render_workers) as render_pool, \
+                ProcessPoolExecutor(max_workers=self.config.caption_workers) as caption_pool:
+            self._render_pool = render_pool
+            self._caption_pool = caption_pool
+
+            # One-time preprocessing of the background footage and music
+            loop = asyncio.get_running_loop()
+            preparations = [
+                loop.run_in_executor(render_pool, cache.prepare)
+                for cache in self.segment_caches.values() if not cache.is_prepared()
+            ]
+            if needs_music(self.config.background_music, self.config.music_gain):
+                preparations.append(loop.run_in_executor(render_pool, prepare_music_bed, self.config.background_music))
+            await asyncio.gather(*preparations)
+
+            while True:
+                # Take a slot before pulling the next story, so a queued story is never leased while waiting
+                await admission.acquire()
+                try:
+                    story_index, story = await stories.__anext__()
+                except StopAsyncIteration:
+                    admission.release()
+                    break
+                task = asyncio.create_task(self._run_story(story_index, story))
+                task.add_done_callback(lambda _: admission.release())
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            if pending:
+                await asyncio.gather(*pending)
+
+        metrics.write_prometheus_summary(self.traces, self.config.metrics_file, len(self.result.succeeded), len(self.result.failed))
+        return self.result
+
+    async def _run_story(self, story_index: int, story: str):
+        heartbeat = asyncio.create_task(self._heartbeat(story_index)) if self.queue else None
+        with metrics.collecting(f"story_{story_index}") as trace:
+            try:
+                with metrics.span("story"):
+                    await self._process_story(story_index, story)
+                self.result.succeeded.append(story_index)
+                self.result.failed.pop(story_index, None)  # An earlier attempt in this run failed
+                if self.queue:
+                    await asyncio.to_thread(self.queue.complete, story_index, self.worker)
+            except Exception as e:
+                logging.error(f"Failed to process story {story_index}: {e}")
+                self.result.failed[story_index] = str(e)
+                if self.queue:
+                    await asyncio.to_thread(self.queue.fail, story_index, self.worker, str(e))
+            finally:
+                if heartbeat:
+                    heartbeat.cancel()
+        self.traces.append(trace)
+        try:
+            trace.write_json(os.path.join(self.config.trace_dir, f"story_{story_index}.json"))
+        except OSError as e:
+            logging.warning(f"Failed to write trace for story {story_index}: {e}")
+
+    async def _heartbeat(self, story_index: int):
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                if not await asyncio.to_thread(self.queue.heartbeat, story_index, self.worker):
+                    logging.warning(f"Lost the lease on story {story_index}; another worker may redo it")
+                    return
+            except Exception as e:
+                logging.warning(f"Heartbeat for story {story_index} failed: {e}")
+
+    async def _set_stage(self, job: StoryJob, stage: str, status: str):
+        if self.queue:
+            await asyncio.to_thread(self.queue.set_stage, job.index, stage, status, self.worker)
+
+    async def _in_pool(self, pool: ProcessPoolExecutor, name: str, func, *args):
+        """
+        Run ``func`` in a worker process and merge the spans it recorded into the current trace.
+        """
+        result, child_trace = await asyncio.get_running_loop().run_in_executor(
+            pool, metrics.run_traced, name, func, *args
+        )
+        trace = metrics.current_trace()
+        if trace is not None:
+            trace.merge(child_trace)
+        return result
+
+    def _stage_params(self, story_index: int, story: str) -> Dict[str, dict]:
+        config = self.config
+        encode = {
+            "fps": config.fps,
+            "target_width": config.target_width,
+            "target_height": config.target_height,
+            "crf": config.crf,
+            "preset": config.preset,
+            "threads": config.threads,
+            "x264_params": config.x264_params,
+            "prenormalized_footage": config.prenormalized_footage,
+            "segment_seconds": config.segment_seconds,
+            "layout_size": list(config.layout_size),
+            # Replacing or touching any background source invalidates every render
+            "footage": [file_identity(source) for source in self.footage.sources],
+            "footage_index_path": os.path.abspath(config.footage_index_path),
+        }
+        if config.seed is not None:
+            encode["seed"] = config.seed
+        if config.segment_plan_dir:
+            # Promotion must re-render a story whose approved draft now shows other footage
+            encode["planned_segment"] = self._planned_segment(story_index)
+        timing = {}
+        if config.playback_rate != 1.0:
+            # Footage length, caption times and the audio all follow the playback rate
+            timing["playback_rate"] = config.playback_rate
+        encode.update(timing)
+        render = dict(encode, render_mode=config.render_mode)
+        if config.renditions:
+            render["renditions"] = [list(profile) for profile in config.renditions]
+        return {
+            "tts": {"text": fingerprint(story), "voice": config.voice, "rate": config.tts_rate, "pitch": config.tts_pitch},
+            "words": {"transcription_backend": config.transcription_backend},
+            "base": encode,
+            "mix": dict(timing, background_music=file_identity(config.background_music), music_gain=config.music_gain, ducking=config.music_ducking),
+            "mux": dict(timing),
+            "caption": dict(timing),
+            "render": render,
+        }
+
+    def _new_job(self, story_index: int, story: str) -> StoryJob:
+        config = self.config
+        output_video = os.path.join(config.output_dir, f"story_{story_index}.mp4")
+        params = self._stage_params(story_index, story)
+
+        # Each stage's key covers its own parameters and, transitively, everything upstream
+        keys: Dict[str, str] = {}
+        for stage, deps in self.dependencies.items():
+            keys[stage] = fingerprint(stage, params[stage], [keys[dep] for dep in deps])
+
+        return StoryJob(
+            index=story_index,
+            text=story,
+            audio_file=os.path.join(config.audio_dir, f"story_{story_index}.mp3"),
+            temp_video=os.path.join(config.output_dir, f"temp_story_{story_index}.mp4"),
+            output_video=output_video,
+            captioned_video=os.path.join(config.output_dir, f"story_{story_index}_captioned.mp4"),
+            manifest=StoryManifest(os.path.join(config.manifest_dir, f"story_{story_index}.json")),
+            keys=keys,
+            params=params,
+        )
+
+    async def _process_story(self, story_index: int, story: str):
+        job = self._new_job(story_index, story)
+        final_stage = list(self.dependencies)[-1]
+        if not self.config.force and job.manifest.is_fresh(final_stage, job.keys[final_stage]):
+            logging.info(f"Story {story_index} is up to date; skipping.")
+            return
+        await self._ensure(job, final_stage)
+
+    async def _ensure(self, job: StoryJob, stage: str):
+        """
+        Bring ``stage`` up to date, building only the dependencies it actually needs.
+        """
+        if stage in job.done:
+            return
+        key = job.keys[stage]
+        if self.config.force or not job.manifest.is_fresh(stage, key):
+            for dep in self.dependencies[stage]:
+                await self._ensure(job, dep)
+            await self._set_stage(job, stage, "running")
+            try:
+                with metrics.span(stage):
+                    outputs, meta = await self.stages[stage](job)
+            except Exception:
+                await self._set_stage(job, stage, "failed")
+                raise
+            job.manifest.record(stage, key, job.params[stage], outputs, meta)
+        job.done.add(stage)
+        await self._set_stage(job, stage, "done")
+
+    async def _stage_tts(self, job: StoryJob):
+        from tts_utils import synthesize_speech_with_retry  # edge-tts and aiohttp, only when narrating
+
+        config = self.config
+        async with self._tts_slots:
+            logging.info(f"Synthesizing speech for story {job.index}...")
+            speech_duration, words = await synthesize_speech_with_retry(
+                job.text, job.audio_file, config.voice, retries=config.tts_retries,
+                rate=config.tts_rate, pitch=config.tts_pitch, cache=self.tts_cache,
+                chunk_chars=config.tts_chunk_chars
+            )
+        logging.info(f"Speech duration for story {job.index}: {speech_duration:.2f} seconds")
+        return [job.audio_file], {"duration": speech_duration, "words": [list(w) for w in words]}
+
+    def _transcription_backend(self) -> "TranscriptionBackend":
+        # Built on first use so runs that never transcribe need no client, API key or import
+        if self._transcriber is None:
+            from transcription import make_backend
+
+            self._transcriber = make_backend(self.config.transcription_backend, submit_concurrency=self.config.transcribe_concurrency)
+        return self._transcriber
+
+    async def _stage_words(self, job: StoryJob):
+        words = [Word(*w) for w in job.manifest.meta("tts")["words"]]
+        if not words:
+            # Transcription of the narration itself, only needed when edge-tts sent no word boundaries
+            words = to_words(await self._transcription_backend().transcribe(job.audio_file, self.transcript_cache))
+        return [], {"words": [list(w) for w in words]}
+
+    async def _stage_mix(self, job: StoryJob):
+        config = self.config
+        # The playback rate is applied to the narration before the music goes in, so the
+        # music keeps its tempo; without music it is left to the final encode. The narration
+        # passed through is still an output, so losing it makes this stage (and tts) stale.
+        if not needs_music(config.background_music, config.music_gain):
+            return [job.audio_file], {"audio": job.audio_file, "playback_rate": config.playback_rate}
+        mixed_audio = os.path.join(config.audio_dir, f"story_{job.index}_mix.flac")
+        await self._in_pool(
+            self._render_pool, "mix", mix_audio,
+            job.audio_file, mixed_audio, config.background_music, config.music_gain, config.music_ducking,
+            config.playback_rate
+        )
+        return [mixed_audio], {"audio": mixed_audio, "playback_rate": 1.0}
+
+    def _video_duration(self, job: StoryJob) -> float:
+        return job.manifest.meta("tts")["duration"] / self.config.playback_rate
+
+    def _planned_segment(self, story_index: int) -> Optional[Segment]:
+        """
+        The footage segment recorded by the story's draft in ``segment_plan_dir``, if any.
+        """
+        plan = StoryManifest(os.path.join(self.config.segment_plan_dir, f"story_{story_index}.json"))
+        for stage in ("render", "base"):
+            if stage in plan.stages:
+                return Segment(*plan.meta(stage)["segment"])
+        return None
+
+    def _pick_segment(self, job: StoryJob) -> Segment:
+        duration = self._video_duration(job)
+        if self.config.segment_plan_dir:
+            segment = self._planned_segment(job.index)
+            if segment is not None and abs(segment.duration - duration) < 1e-3:
+                logging.info(f"Story {job.index}: using the footage from its approved draft")
+                return segment
+            logging.warning(f"Story {job.index} has no matching draft; picking new footage")
+        rng = random.Random(f"{self.config.seed}:{job.index}") if self.config.seed is not None else None
+        return self.footage.pick_segment(duration, rng)
+
+    def _soundtrack(self, job: StoryJob) -> str:
+        return job.manifest.meta("mix")["audio"]
+
+    def _soundtrack_rate(self, job: StoryJob) -> float:
+        # The speed-up the soundtrack still needs when it is muxed
+        return job.manifest.meta("mix").get("playback_rate", 1.0)
+
+    def _captions(self, job: StoryJob):
+        words = [Word(*w) for w in job.manifest.meta("words")["words"]]
+        return generate_dynamic_captions_from_words(words, playback_rate=self.config.playback_rate)
+
+    async def _stage_base(self, job: StoryJob):
+        logging.info(f"Generating base video for story {job.index}...")
+        segment = self._pick_segment(job)
+        await self._in_pool(
+            self._render_pool, "base", _build_base_video,
+            self.config, job.temp_video, segment, self.segment_caches.get(segment.path)
+        )
+        logging.info(f"Base video created at: {job.temp_video}")
+        return [job.temp_video], {"segment": list(segment)}
+
+    async def _stage_mux(self, job: StoryJob):
+        logging.info(f"Combining audio and video for story {job.index}...")
+        await self._in_pool(
+            self._render_pool, "mux", _mux_narration, self._soundtrack(job), job.temp_video, job.output_video,
+            self._soundtrack_rate(job)
+        )
+        logging.info(f"Combined video saved at: {job.output_video}")
+        return [job.output_video], {}
+
+    async def _stage_caption(self, job: StoryJob):
+        os.makedirs(os.path.dirname(job.captioned_video), exist_ok=True)
+        await self._in_pool(
+            self._caption_pool, "caption", functools.partial(add_quick_captions_to_video_with_music, audio_file=self._soundtrack(job), playback_rate=self._soundtrack_rate(job)),
+            job.output_video, self._captions(job), job.captioned_video
+        )
+        logging.info(f"Video with caption saved: {job.captioned_video}")
+        return [job.captioned_video], {}
+
+    async def _stage_render(self, job: StoryJob):
+        # Cut, caption and mux in one encode
+        segment = self._pick_segment(job)
+        os.makedirs(os.path.dirname(job.captioned_video), exist_ok=True)
+        logging.info(f"Rendering captioned video for story {job.index}...")
+        await self._in_pool(
+            self._render_pool, "render", _render_final_video,
+            self.config, self._soundtrack(job), self._captions(job), job.temp_video, job.captioned_video,
+            segment, self.segment_caches.get(segment.path), self._soundtrack_rate(job)
+        )
+        logging.info(f"Video with caption saved: {job.captioned_video}")
+        outputs = [job.captioned_video, *(rendition_path(job.captioned_video, profile) for profile in self.config.renditions)]
+        return outputs, {"segment": list(segment)}
+
+
+def run_worker(queue: JobQueue, config: PipelineConfig, worker: str, wait: bool = False) -> BatchResult:
+    """
+    Work through a shared JobQueue alongside any other workers using the same database.
+
+    Args:
+        queue (JobQueue): The shared backlog, e.g. on storage every render node mounts.
+        config (PipelineConfig): Paths, encoder settings and pool sizes.
+        worker (str): This worker's id, e.g. ``job_queue.default_worker_id()``.
+        wait (bool, optional): Keep polling for new stories once the queue is drained. Defaults to False.
+
+    Returns:
+        BatchResult: The stories this worker finished and the ones that failed here.
+    """
+    return asyncio.run(BatchRunner(config).run_queue(queue, worker, wait))
+
+
+def run_batch(stories: Iterable[str], config: PipelineConfig, first_index: int = 1) -> BatchResult:
+    """
+    Process every story with overlapping stages.
+
+    Args:
+        stories (Iterable[str]): Story texts, consumed lazily.
+        config (PipelineConfig): Paths, encoder settings and pool sizes.
+        first_index (int, optional): Story number of the first story, e.g. when resuming
+            or processing a shard from StoryIndex. Defaults to 1.
+
+    Returns:
+        BatchResult: Indices of the stories that succeeded and the error for each failure.
+    """
+    return asyncio.run(BatchRunner(config).run(stories, first_index))
@@ -0,0 +1,193 @@
+# segment_cache.py
+import os
+import csv
+import json
+import random
+import hashlib
+import logging
+import subprocess
+from typing import List, Optional, Tuple
+
+from constants import SEGMENT_CACHE_DIR
+from ffmpeg_utils import run_ffmpeg, scale_crop_filter
+
+
+class SegmentCache:
+    """
+    Background footage pre-normalized into short closed-GOP segments.
+
+    ``prepare`` transcodes a source once to the pipeline's size, fps and CRF,
+    cut into ``segment_seconds`` pieces that each start on an IDR frame. A base
+    video of any length is then assembled by concat-demuxing consecutive
+    segments with stream copy and trimming only the tail, so per-story cost is
+    file I/O rather than decode, scale and encode.
+
+    Segments live under a directory keyed by the source's identity (path, size,
+    mtime) and the encode settings, so changing either prepares a fresh set.
+    """
+
+    def __init__(self, source: str, fps: int = 60, target_width: int = 1080, target_height: int = 1920, crf: int = 25, preset: str = "slow", segment_seconds: float = 2.0, cache_dir: str = SEGMENT_CACHE_DIR):
+        self.source = os.path.abspath(source)
+        self.fps = fps
+        self.target_width = target_width
+        self.target_height = target_height
+        self.crf = crf
+        self.preset = preset
+        self.segment_seconds = segment_seconds
+
+        stat = os.stat(self.source)
+        identity = json.dumps([self.source, stat.st_size, stat.st_mtime, fps, target_width, target_height, crf, preset, segment_seconds])
+        self.directory = os.path.join(cache_dir, hashlib.sha256(identity.encode("utf-8")).hexdigest()[:16])
+        self.manifest_path = os.path.join(self.directory, "segments.json")
+
+    def is_prepared(self) -> bool:
+        return os.path.exists(self.manifest_path)
+
+    def segments(self) -> List[Tuple[str, float, float]]:
+        """
+        (path, start, duration) of every prepared segment, in source order.
+        """
+        with open(self.manifest_path, "r", encoding="utf-8") as manifest:
+            return [tuple(entry) for entry in json.load(manifest)]
+
+    def prepare(self, timeout: Optional[int] = None):
+        """
+        Transcode the source into normalized segments (once; a no-op when already prepared).
+        """
+        if self.is_prepared():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        segment_list = os.path.join(self.directory, "segments.csv")
+        gop = max(int(round(self.fps * self.segment_seconds)), 1)
+
+        command = [
+            'ffmpeg', '-y',
+            '-i', self.source,
+            '-vf', f"{scale_crop_filter(self.target_width, self.target_height)}",
+            '-r', str(self.fps),
+            '-an',
+            '-c:v', 'libx264',
+            '-preset', self.preset,
+            '-crf', str(self.crf),
+            '-pix_fmt', 'yuv420p',
+            '-profile:v', 'high',
+            '-g', str(gop),
+            '-keyint_min', str(gop),
+            '-sc_threshold', '0',                      # No scene-cut keyframes inside a segment
+            '-flags', '+cgop',                         # Closed GOPs so every segment decodes on its own
+            '-force_key_frames', f"expr:gte(t,n_forced*{self.segment_seconds})",
+            '-f', 'segment',
+            '-segment_time', str(self.segment_seconds),
+            '-reset_timestamps', '1',
+            '-segment_list', segment_list,
+            '-segment_list_type', 'csv',
+            os.path.join(self.directory, "seg_%05d.mp4")
+        ]
+        logging.info(f"Running FFmpeg command: {' '.join(command)}")
+        try:
+            run_ffmpeg(command, timeout=timeout, label="prepare_segments")
+        except subprocess.TimeoutExpired:
+            logging.error(f"FFmpeg command timed out after {timeout} seconds.")
+            raise TimeoutError(f"FFmpeg command exceeded timeout of {timeout} seconds.")
+        except subprocess.CalledProcessError as e:
+            logging.error(f"FFmpeg failed to prepare segments: {e.stderr}")
+            raise e
+
+        segments = []
+        with open(segment_list, "r", encoding="utf-8", newline="") as listing:
+            for name, start, end in csv.reader(listing):
+                segments.append((os.path.join(self.directory, name), float(start), float(end) - float(start)))
+
+        # Publish the manifest last: its presence marks the cache as complete
+        tmp_manifest = self.manifest_path + ".tmp"
+        with open(tmp_manifest, "w", encoding="utf-8") as manifest:
+            json.dump(segments, manifest)
+        os.replace(tmp_manifest, self.manifest_path)
+        logging.info(f"Prepared {len(segments)} segments of {self.source} in {self.directory}")
+
+    def write_concat_list(self, list_file: str, desired_duration: float, start_time: Optional[float] = None) -> float:
+        """
+        Write a concat-demuxer list of the consecutive segments covering desired_duration.
+
+        Args:
+            list_file (str): Path of the list to write.
+            desired_duration (float): Seconds of footage the list must cover.
+            start_time (float, optional): Source time to start near; snapped down to the
+                segment containing it. Defaults to a random segment.
+
+        Returns:
+            float: Source time at which the listed footage starts.
+
+        Raises:
+            ValueError: If the prepared footage is shorter than desired_duration.
+        """
+        segments = self.segments()
+        starts = [start for _, start, _ in segments]
+        total = sum(duration for _, _, duration in segments)
+        if desired_duration > total:
+            raise ValueError(f"Desired duration ({desired_duration}s) exceeds total video duration ({total}s).")
+
+        # Latest segment from which enough footage remains
+        remaining, last_index = 0.0, len(segments)
+        while last_index > 0 and remaining < desired_duration:
+            last_index -= 1
+            remaining += segments[last_index][2]
+
+        if start_time is None:
+            first = random.randint(0, last_index)
+        else:
+            first = min(max(sum(1 for s in starts if s <= start_time) - 1, 0), last_index)
+
+        chosen, covered = [], 0.0
+        for path, _, duration in segments[first:]:
+            chosen.append(path)
+            covered += duration
+            if covered >= desired_duration:
+                break
+
+        with open(list_file, "w", encoding="utf-8") as listing:
+            for path in chosen:
+                listing.write(f"file '{path.replace(os.sep, '/')}'\n")
+        return starts[first]
+
+    def assemble(self, output_video: str, desired_duration: float, start_time: Optional[float] = None, timeout: int = 300) -> float:
+        """
+        Build a base video by stream-copying consecutive segments.
+
+        Args:
+            output_video (str): Path to save the assembled video.
+            desired_duration (float): Duration of the output in seconds.
+            start_time (float, optional): Source time to start near; snapped down to the
+                segment containing it. Defaults to a random segment.
+            timeout (int, optional): Timeout for the FFmpeg command in seconds. Defaults to 300.
+
+        Returns:
+            float: Source time at which the assembled video starts.
+
+        Raises:
+            ValueError: If the prepared footage is shorter than desired_duration.
+        """
+        list_file = os.path.splitext(output_video)[0] + "_segments.txt"
+        start = self.write_concat_list(list_file, desired_duration, start_time)
+
+        command = [
+            'ffmpeg', '-y',
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', list_file,
+            '-t', f"{desired_duration:.2f}",   # Only the tail is trimmed
+            '-c', 'copy',
+            output_video
+        ]
+        logging.info(f"Running FFmpeg command: {' '.join(command)}")
+        try:
+            run_ffmpeg(command, timeout=timeout, label="assemble_segments")
+        except subprocess.TimeoutExpired:
+            logging.error(f"FFmpeg command timed out after {timeout} seconds.")
+            raise TimeoutError(f"FFmpeg command exceeded timeout of {timeout} seconds.")
+        except subprocess.CalledProcessError as e:
+            logging.error(f"FFmpeg failed to assemble segments: {e.stderr}")
+            raise e
+        finally:
+            os.remove(list_file)
+        return start
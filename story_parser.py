@@ -1,49 +1,177 @@
 # story_parser.py
 import os
+import json
+from typing import Iterator, List, Optional, Tuple
 
-import os
 
-def read_stories(file_path: str):
+def _is_story_header(stripped_line: str) -> bool:
+    return stripped_line.startswith("STORY")
+
+
+def _join_story(lines: List[str]) -> str:
+    return "\n".join(lines).strip()
+
+
+def iter_stories(file_path: str) -> Iterator[str]:
     """
-    Reads stories from a text file, where each story starts with a line that begins with "STORY".
-    The "STORY" heading lines are used to delimit stories but are not included in the returned story texts.
+    Lazily yield stories from a text file, where each story starts with a line that begins with "STORY".
+    The "STORY" heading lines are used to delimit stories but are not included in the yielded story texts.
+
+    Only the story currently being read is held in memory, so the first story is
+    available immediately even for very large files.
 
     Args:
         file_path (str): The path to the text file containing the stories.
 
-    Returns:
-        List[str]: A list of story texts.
-    
+    Yields:
+        str: Story texts, in file order. Empty stories are skipped.
+
     Raises:
         FileNotFoundError: If the specified file does not exist.
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"The file '{file_path}' does not exist.")
 
-    stories = []
     current_story = []
 
     with open(file_path, 'r', encoding='utf-8') as file:
-        for line_number, line in enumerate(file, start=1):
+        for line in file:
             stripped_line = line.strip()
-            if stripped_line.startswith("STORY"):
-                # If there's an existing story, append it to the stories list
+            if _is_story_header(stripped_line):
+                # If there's an existing story, yield it
                 if current_story:
-                    story_text = "\n".join(current_story).strip()
+                    story_text = _join_story(current_story)
                     if story_text:  # Ensure that the story is not empty
-                        stories.append(story_text)
+                        yield story_text
                     current_story = []  # Reset for the next story
                 # Do not include the "STORY" heading in the story text
                 continue  # Skip adding the "STORY" line to current_story
-            else:
+            elif stripped_line:
                 # Append non-empty lines to the current story
-                if stripped_line:
-                    current_story.append(stripped_line)
+                current_story.append(stripped_line)
 
-    # After reading all lines, add the last story if it exists
+    # After reading all lines, yield the last story if it exists
     if current_story:
-        story_text = "\n".join(current_story).strip()
+        story_text = _join_story(current_story)
         if story_text:
-            stories.append(story_text)
+            yield story_text
+
+
+def read_stories(file_path: str):
+    """
+    Reads stories from a text file, where each story starts with a line that begins with "STORY".
+    The "STORY" heading lines are used to delimit stories but are not included in the returned story texts.
+
+    Args:
+        file_path (str): The path to the text file containing the stories.
+
+    Returns:
+        List[str]: A list of story texts.
+
+    Raises:
+        FileNotFoundError: If the specified file does not exist.
+    """
+    return list(iter_stories(file_path))
+
+
+class StoryIndex:
+    """
+    Persistent byte-offset index of the stories in a story file.
+
+    The first use scans the file once and records the byte range of every
+    non-empty story, numbered from 1 exactly as ``read_stories`` orders them.
+    The index is saved next to the file (``<file>.idx``) and reused until the
+    file's size or mtime changes, after which random access by story number,
+    contiguous shards for parallel workers and resuming from story N all seek
+    straight to the right offset.
+    """
+
+    def __init__(self, file_path: str, index_path: Optional[str] = None):
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"The file '{file_path}' does not exist.")
+        self.file_path = file_path
+        self.index_path = index_path or f"{file_path}.idx"
+        self.ranges: List[Tuple[int, int]] = []
+        if not self._load():
+            self.build()
+
+    def _signature(self) -> List[float]:
+        stat = os.stat(self.file_path)
+        return [stat.st_size, stat.st_mtime]
+
+    def _load(self) -> bool:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as index_file:
+                index = json.load(index_file)
+        except (FileNotFoundError, ValueError):
+            return False
+        if index.get("signature") != self._signature():
+            return False
+        self.ranges = [tuple(r) for r in index["ranges"]]
+        return True
+
+    def build(self):
+        """
+        Scan the story file and save the byte range of every non-empty story.
+        """
+        ranges = []
+        story_start, has_text = 0, False
+        offset = 0
+        with open(self.file_path, 'rb') as file:
+            for raw_line in file:
+                stripped_line = raw_line.decode('utf-8').strip()
+                if _is_story_header(stripped_line):
+                    if has_text:
+                        ranges.append((story_start, offset))
+                    story_start, has_text = offset + len(raw_line), False
+                elif stripped_line:
+                    has_text = True
+                offset += len(raw_line)
+        if has_text:
+            ranges.append((story_start, offset))
+
+        self.ranges = ranges
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as index_file:
+            json.dump({"signature": self._signature(), "ranges": ranges}, index_file)
+        os.replace(tmp_path, self.index_path)
+
+    def __len__(self) -> int:
+        return len(self.ranges)
+
+    def _read(self, file, story_number: int) -> str:
+        start, end = self.ranges[story_number - 1]
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+        lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        return _join_story([line.strip() for line in lines if line.strip()])
+
+    def get(self, story_number: int) -> str:
+        """
+        Return story ``story_number`` (1-based).
+        """
+        if not 1 <= story_number <= len(self.ranges):
+            raise IndexError(f"Story {story_number} out of range (1-{len(self.ranges)})")
+        with open(self.file_path, 'rb') as file:
+            return self._read(file, story_number)
+
+    def iter_range(self, first: int = 1, last: Optional[int] = None) -> Iterator[str]:
+        """
+        Lazily yield stories ``first`` through ``last`` (inclusive, 1-based).
+        """
+        last = len(self.ranges) if last is None else min(last, len(self.ranges))
+        with open(self.file_path, 'rb') as file:
+            for story_number in range(max(first, 1), last + 1):
+                yield self._read(file, story_number)
 
-    return stories
+    def shard(self, worker_index: int, num_workers: int) -> Tuple[int, int]:
+        """
+        The contiguous (first, last) story numbers assigned to ``worker_index`` of ``num_workers``.
+        A worker with nothing to do gets an empty range (first > last).
+        """
+        if not 0 <= worker_index < num_workers:
+            raise ValueError(f"worker_index must be in [0, {num_workers})")
+        per_worker, extra = divmod(len(self.ranges), num_workers)
+        first = worker_index * per_worker + min(worker_index, extra) + 1
+        last = first + per_worker + (1 if worker_index < extra else 0) - 1
+        return first, last
@@ -1,51 +1,53 @@
 import os
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, AudioFileClip, CompositeAudioClip
-from pydub import AudioSegment
-import speech_recognition as sr
-from moviepy.config import change_settings
-import requests
-import time
-import assemblyai as aai
-from dotenv import load_dotenv
-load_dotenv()
-
-change_settings({"IMAGEMAGICK_BINARY": "C:\Program Files (x86)\ImageMagick-7.1.1-Q16\magick.exe"})
-
-# Function to extract audio from video
-def extract_audio_from_video(input_video: str, output_audio: str):
-    try:
-        print(f"Extracting audio from video: {input_video} -> {output_audio}")
-        video_clip = VideoFileClip(input_video)
-        video_clip.audio.write_audiofile(output_audio, codec="libmp3lame")
-        print("Audio extraction completed.")
-    except Exception as e:
-        print(f"Error during audio extraction: {e}")
-        raise
+from audio_mix import mix_audio, needs_music
+from caption_style import DEFAULT_CAPTION_STYLE, CaptionStyle
+from ffmpeg_utils import combine_audio_video
+from metrics import timed
+from transcript_cache import TranscriptCache, pcm_digest
+from word_timings import to_words
 
-# Function to convert audio to PCM WAV format
-def convert_audio_to_wav(input_audio: str, output_audio: str):
-    try:
-        print(f"Converting audio to WAV: {input_audio} -> {output_audio}")
-        audio = AudioSegment.from_file(input_audio)
-        audio = audio.set_channels(1)  # Ensure mono audio
-        audio = audio.set_frame_rate(16000)  # Standard sample rate for transcription
-        audio.export(output_audio, format="wav")
-        print("Audio conversion completed.")
-    except Exception as e:
-        print(f"Error during audio conversion: {e}")
-        raise
+# moviepy, assemblyai, dotenv, numpy and the caption compositor are imported by
+# the functions that use them, so importing this module (as the pipeline and
+# CLI do) stays cheap.
 
 # Function to transcribe audio using SpeechRecognition
-def transcribe_audio_with_word_timestamps(audio_file: str):
+@timed("transcribe_audio_with_word_timestamps")
+def transcribe_audio_with_word_timestamps(audio_file, cache: TranscriptCache = None):
     """
     Transcribe audio with word-level timestamps using AssemblyAI.
     Args:
-        audio_file (str): Path to the local audio file or a publicly accessible URL.
+        audio_file: Path to a local audio or video file, a publicly accessible URL, or
+            16 kHz mono int16 PCM already decoded with ``decode_pcm``. Local files are
+            decoded once in memory and uploaded as WAV bytes; no temp files are written.
+        cache (TranscriptCache, optional): Transcript store keyed by the decoded PCM. On a
+            hit the AssemblyAI client is not touched at all. Not used for URLs.
     Returns:
-        List[aai.Word]: List of word objects with timestamps from AssemblyAI.
+        List[aai.Word]: List of word objects with timestamps from AssemblyAI
+        (plain ``Word`` tuples of the same shape when a cache is used).
     """
+    from audio_pcm import decode_pcm, pcm_to_wav
+
+    source = audio_file
+    label = audio_file if isinstance(audio_file, str) else "in-memory PCM"
+    if isinstance(audio_file, str) and os.path.exists(audio_file):
+        audio_file = decode_pcm(audio_file)
+
+    cache_key = None
+    if not isinstance(audio_file, str):
+        if cache is not None:
+            cache_key = pcm_digest(audio_file)
+            cached_words = cache.get(cache_key)
+            if cached_words is not None:
+                print(f"Loaded cached transcript for: {label}")
+                return cached_words
+        source = pcm_to_wav(audio_file)
+
+    import assemblyai as aai
+    from dotenv import load_dotenv
+
     try:
         # Set your AssemblyAI API key
+        load_dotenv()
         aai.settings.api_key = os.getenv('AAI_API_KEY')
 
         # Create a transcription configuration
@@ -58,8 +60,8 @@ def transcribe_audio_with_word_timestamps(audio_file: str):
         transcriber = aai.Transcriber(config=config)
 
         # Start transcription
-        print(f"Starting transcription for: {audio_file}")
-        transcript = transcriber.transcribe(audio_file)
+        print(f"Starting transcription for: {label}")
+        transcript = transcriber.transcribe(source)
 
         # Check the status of the transcription
         if transcript.status == aai.TranscriptStatus.error:
@@ -67,6 +69,10 @@ def transcribe_audio_with_word_timestamps(audio_file: str):
             raise Exception(f"Transcription error: {transcript.error}")
 
         print("Transcription completed.")
+        if cache_key is not None:
+            words = to_words(transcript.words)
+            cache.put(cache_key, words)
+            return words
         return transcript.words  # Return the word objects with timestamps
 
     except Exception as e:
@@ -74,14 +80,17 @@ def transcribe_audio_with_word_timestamps(audio_file: str):
         raise
 
 # Function to generate quick captions
-def generate_dynamic_captions_from_words(words, words_per_caption=3, gap_threshold=1.0, long_word_length=7):
+def generate_dynamic_captions_from_words(words, words_per_caption=3, gap_threshold=1.0, long_word_length=7, playback_rate=1.0):
     """
     Generate dynamic captions based on word-level timestamps, adjusting for pauses and long words.
     Args:
-        words (List[aai.Word]): List of Word objects from AssemblyAI.
+        words (List[aai.Word]): List of Word objects from AssemblyAI, or word timings
+            from ``synthesize_speech_async(..., with_word_timings=True)``.
         words_per_caption (int): Maximum number of words per caption.
         gap_threshold (float): Time gap in seconds to consider a new caption.
         long_word_length (int): Minimum length of a word to consider it "long".
+        playback_rate (float): Speed the narration is played at in the video; caption times
+            are divided by it. Grouping still uses the original timings.
     Returns:
         List[Tuple[float, float, str]]: Captions as (start_time, end_time, text).
     """
@@ -91,7 +100,7 @@ def generate_dynamic_captions_from_words(words, words_per_caption=3, gap_thresho
 
     for i, word in enumerate(words):
         # Start timing for the first word in the buffer
-        if not start_time:
+        if start_time is None:
             start_time = word.start / 1000.0  # Convert milliseconds to seconds
 
         buffer.append(word.text)
@@ -113,7 +122,7 @@ def generate_dynamic_captions_from_words(words, words_per_caption=3, gap_thresho
             # End caption here
             end_time = word.end / 1000.0  # Convert milliseconds to seconds
             caption_text = " ".join(buffer)
-            captions.append((start_time, end_time, caption_text))
+            captions.append((start_time / playback_rate, end_time / playback_rate, caption_text))
             buffer = []  # Reset buffer
             start_time = None  # Reset start time for the next caption
 
@@ -121,7 +130,8 @@ def generate_dynamic_captions_from_words(words, words_per_caption=3, gap_thresho
     return captions
 
 # Function to overlay captions onto video
-def add_quick_captions_to_video_with_music(video_path: str, captions, output_video_path: str, background_music_path: str, fade_duration=0.1):
+@timed("add_quick_captions_to_video_with_music")
+def add_quick_captions_to_video_with_music(video_path: str, captions, output_video_path: str, background_music_path: str = None, fade_duration=0.1, style: CaptionStyle = DEFAULT_CAPTION_STYLE, music_gain: float = 0.0, audio_file: str = None, ducking: bool = False, playback_rate: float = 1.0):
     """
     Overlay captions onto the video and add looping background music.
     Args:
@@ -130,87 +140,112 @@ def add_quick_captions_to_video_with_music(video_path: str, captions, output_vid
         output_video_path (str): Path to save the output video.
         background_music_path (str): Path to the background music file (MP3).
         fade_duration (float): Duration of the fade effect in seconds.
+        style (CaptionStyle): Font, colours, stroke and padding of the captions.
+        music_gain (float): Linear music volume; at 0 the music is skipped entirely.
+        audio_file (str): Soundtrack to use instead of the video's own audio, e.g. the narration
+            or an already mixed track. Music, if any, is mixed under it.
+        ducking (bool): Lower the music while the narrator speaks.
+        playback_rate (float): Speed audio_file is played at, applied with atempo before any
+            music is mixed under it (or when it is muxed, without music). Captions must
+            already be on the sped-up timeline.
     """
+    mixed_audio = os.path.splitext(output_video_path)[0] + "_mix.flac"
+    silent_video = os.path.splitext(output_video_path)[0] + "_silent.mp4"
+    from moviepy.editor import VideoFileClip
+    from caption_track import CaptionTrack
+
     try:
         print(f"Processing video: {video_path} with captions and music")
         video = VideoFileClip(video_path)
-        subtitle_clips = []
-
-        # Add captions to the video
-        for start_time, end_time, text in captions:
-            subtitle = (TextClip(text, fontsize=75,  # Font size in 'vmin' relative to video height
-                                 color='#ffffff',  # Fill color
-                                 font='./Montserrat-Bold.otf',  # Font family
-                                 stroke_color='#000000',  # Stroke color
-                                 stroke_width=3))  # Stroke width in 'vmin'
-
-            # Position at the bottom with padding
-            subtitle = (subtitle
-                        .set_position(('center', video.size[1] - subtitle.size[1] - video.size[1] * 0.25))  # Bottom padding
-                        .set_duration(end_time - start_time)
-                        .set_start(start_time))
-            subtitle = subtitle.crossfadein(fade_duration).crossfadeout(fade_duration)  # Add fade effect
-            subtitle_clips.append(subtitle)
-
-        # Combine the video and subtitle clips
-        video_with_subtitles = CompositeVideoClip([video, *subtitle_clips])
-
-        # Add background music
-        print(f"Adding background music from: {background_music_path}")
-        background_music = AudioFileClip(background_music_path)
-
-        # Adjust the volume of the background music
-        background_music = background_music.volumex(0.00)  # Set music volume
-
-        # Handle music longer or shorter than video duration
-        duration = video.duration
-        if background_music.duration < duration:
-            # Loop music to match video duration
-            looped_music = background_music.fx(AudioFileClip.loop, duration=duration)
-        else:
-            # Trim music to match video duration
-            looped_music = background_music.subclip(0, duration)
 
-        # Combine the video's original audio with the background music
-        final_audio = CompositeAudioClip([video_with_subtitles.audio, looped_music])
-        video_with_subtitles = video_with_subtitles.set_audio(final_audio)
+        # Burn the captions in as one time-indexed clip (sprites rasterized by Pillow and cached per
+        # (text, style)), so per-frame cost doesn't grow with the number of captions
+        track = CaptionTrack(captions, video.size[0], video.size[1], style, fade_duration)
+        video_with_subtitles = track.clip(video)
+
+        # Mix the music in FFmpeg, never in moviepy; a no-op at zero gain
+        if needs_music(background_music_path, music_gain):
+            print(f"Adding background music from: {background_music_path}")
+        narration_rate = playback_rate if audio_file else 1.0
+        soundtrack = mix_audio(audio_file or video_path, mixed_audio, background_music_path, music_gain, ducking, narration_rate)
 
         # Export the final video
-        video_with_subtitles.write_videofile(output_video_path, codec="libx264", audio_codec="aac")
+        if soundtrack == video_path:
+            video_with_subtitles.write_videofile(output_video_path, codec="libx264", audio_codec="aac")
+        else:
+            # Render the pictures only and mux the soundtrack with FFmpeg
+            video_with_subtitles.write_videofile(silent_video, codec="libx264", audio=False)
+            combine_audio_video(soundtrack, silent_video, output_video_path, playback_rate=narration_rate if soundtrack == audio_file else 1.0)
         print(f"Video saved at: {output_video_path}")
 
     except Exception as e:
         print(f"Error processing video with captions and music: {e}")
         raise
+    finally:
+        for scratch in (mixed_audio, silent_video):
+            if os.path.exists(scratch):
+                os.remove(scratch)
+
+def caption_paths(input_video: str) -> str:
+    """
+    Derive the captioned output path for a video.
+    Args:
+        input_video (str): Path to the input video.
+    Returns:
+        str: Captioned video path.
+    """
+    video_name = os.path.splitext(os.path.basename(input_video))[0]
+    return f"./output/{video_name}_captioned.mp4"
+
+# Function to recover word timestamps from a finished video
+def transcribe_video(input_video: str, cache: TranscriptCache = None, audio_file: str = None):
+    """
+    Transcribe a video's narration with word-level timestamps.
+    Args:
+        input_video (str): Path to the input video.
+        cache (TranscriptCache, optional): Transcript store to consult and fill.
+        audio_file (str, optional): The narration the video was muxed from. Decoding it is
+            cheaper than demuxing the video; either way the audio is decoded once, straight
+            to 16 kHz mono PCM in memory, with no intermediate MP3 or WAV.
+    Returns:
+        List[aai.Word]: List of word objects with timestamps from AssemblyAI.
+    """
+    from audio_pcm import decode_pcm
+
+    pcm = decode_pcm(audio_file or input_video)
+    return transcribe_audio_with_word_timestamps(pcm, cache)
 
 # Main function to process video and add captions
-def auto_caption(input_video: str):
+def auto_caption(input_video: str, words=None, transcript_cache: TranscriptCache = None, audio_file: str = None):
+    """
+    Caption a narrated video.
+    Args:
+        input_video (str): Path to the narrated video.
+        words (List[Word], optional): Word timings captured during synthesis. When given,
+            audio extraction, conversion and transcription are skipped entirely.
+        transcript_cache (TranscriptCache, optional): Transcript store; defaults to the one
+            under ``TRANSCRIPT_CACHE_DIR`` so re-captioning only pays for the render.
+        audio_file (str, optional): Source narration to transcribe instead of the video's audio track.
+    Returns:
+        str: Path to the captioned video.
+    """
     try:
         print(f"Processing video: {input_video}")
-        video_name = os.path.splitext(os.path.basename(input_video))[0]
-        audio_path = f"./output/audio/{video_name}.mp3"
-        wav_path = f"./output/audio/{video_name}.wav"
-        output_video_path = f"./output/{video_name}_captioned.mp4"
+        output_video_path = caption_paths(input_video)
 
         # Ensure directories exist
-        os.makedirs(os.path.dirname(audio_path), exist_ok=True)
         os.makedirs(os.path.dirname(output_video_path), exist_ok=True)
 
-        # Step 1: Extract audio from video
-        extract_audio_from_video(input_video, audio_path)
-
-        # Step 2: Convert MP3 to WAV
-        convert_audio_to_wav(audio_path, wav_path)
-
-        # Step 3: Transcribe audio to get word-level timestamps
-        words = transcribe_audio_with_word_timestamps(wav_path)
+        # Steps 1-3: Decode and transcribe the narration (unless TTS already told us)
+        if not words:
+            words = transcribe_video(input_video, transcript_cache or TranscriptCache(), audio_file)
 
         # Step 4: Generate captions from word timestamps
         captions = generate_dynamic_captions_from_words(words)
         print(f"First few captions: {captions[:5]}")  # Debugging output
 
         # Step 5: Add captions to video
-        add_quick_captions_to_video_with_music(input_video, captions, output_video_path,  background_music_path="./background.mp3",)
+        add_quick_captions_to_video_with_music(input_video, captions, output_video_path,  background_music_path="./background.mp3", audio_file=audio_file)
 
         print(f"Captioned video saved at: {output_video_path}")
         return output_video_path
@@ -0,0 +1,48 @@
+import os
+
+from build_manifest import StoryManifest, file_identity, fingerprint
+
+
+def test_fingerprint_is_order_independent_for_dicts():
+    assert fingerprint("mix", {"a": 1, "b": 2}) == fingerprint("mix", {"b": 2, "a": 1})
+    assert fingerprint("mix", {"a": 1}) != fingerprint("mix", {"a": 2})
+
+
+def test_file_identity_changes_with_the_file(tmp_path):
+    path = tmp_path / "music.mp3"
+    assert file_identity(None) is None
+    assert file_identity(str(path)) == [str(path), None, None]
+    path.write_bytes(b"a")
+    before = file_identity(str(path))
+    path.write_bytes(b"ab")
+    assert file_identity(str(path)) != before
+
+
+def test_stage_is_fresh_until_key_changes(tmp_path):
+    output = tmp_path / "story_1.mp3"
+    output.write_bytes(b"a")
+    manifest = StoryManifest(str(tmp_path / "story_1.json"))
+    manifest.record("tts", "k1", {"voice": "v"}, [str(output)], {"duration": 2.0})
+    assert manifest.is_fresh("tts", "k1")
+    assert not manifest.is_fresh("tts", "k2")
+    assert not manifest.is_fresh("mix", "k1")
+
+
+def test_stage_is_stale_once_an_output_is_deleted(tmp_path):
+    output = tmp_path / "story_1.mp3"
+    output.write_bytes(b"a")
+    manifest = StoryManifest(str(tmp_path / "story_1.json"))
+    manifest.record("mix", "k", {}, [str(output)], {"audio": str(output)})
+    os.remove(output)
+    assert not manifest.is_fresh("mix", "k")
+
+
+def test_manifest_round_trips_and_survives_corruption(tmp_path):
+    path = tmp_path / "story_1.json"
+    manifest = StoryManifest(str(path))
+    manifest.record("words", "k", {}, [], {"words": [["hi", 0, 100, 1.0]]})
+    reloaded = StoryManifest(str(path))
+    assert reloaded.is_fresh("words", "k")
+    assert reloaded.meta("words") == {"words": [["hi", 0, 100, 1.0]]}
+    path.write_text("{not json")
+    assert StoryManifest(str(path)).stages == {}
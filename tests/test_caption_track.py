@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from caption_track import CaptionTrack
+
+CAPTIONS = [
+    (0.0, 1.0, "one"),
+    (1.0, 2.0, "two"),
+    (1.5, 5.0, "long"),
+    (4.0, 4.5, "three"),
+]
+
+
+@pytest.fixture
+def track():
+    return CaptionTrack(CAPTIONS, 1080, 1920, fade_duration=0.5)
+
+
+def test_active_matches_a_linear_scan(track):
+    for step in range(0, 60):
+        t = step / 10
+        expected = [i for i, (start, end, _) in enumerate(sorted(CAPTIONS)) if start <= t < end]
+        assert track.active(t) == expected, t
+
+
+def test_active_is_end_exclusive(track):
+    assert track.active(1.0) == [1]
+    assert track.active(5.0) == []
+
+
+def test_empty_track():
+    assert CaptionTrack([], 1080, 1920).active(1.0) == []
+
+
+def test_opacity_fades_in_and_out(track):
+    assert track.opacity(0, 0.0) == 0.0
+    assert track.opacity(0, 0.25) == pytest.approx(0.5)
+    assert track.opacity(0, 0.5) == 1.0
+    assert track.opacity(0, 0.75) == pytest.approx(0.5)
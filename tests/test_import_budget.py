@@ -0,0 +1,12 @@
+"""Importing the entry points must stay cheap and must not pull in a heavy backend."""
+from cli import IMPORT_BUDGET, measure_imports
+
+
+def test_entry_points_load_no_heavy_modules():
+    assert measure_imports()["heavy"] == []
+
+
+def test_entry_points_import_within_budget():
+    # Best of a few runs, so a cold filesystem cache doesn't fail the test
+    seconds = min(measure_imports()["seconds"] for _ in range(3))
+    assert seconds <= IMPORT_BUDGET
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"), lease_seconds=60, max_attempts=2, retry_delay=0)
+
+
+def test_enqueue_ignores_duplicates(queue):
+    assert queue.enqueue([(1, "a"), (2, "b")]) == 2
+    assert queue.enqueue([(2, "b"), (3, "c")]) == 1
+    assert queue.counts() == {"pending": 3}
+
+
+def test_claims_lowest_story_and_never_twice(queue):
+    queue.enqueue([(2, "b"), (1, "a")])
+    first = queue.claim("w1")
+    second = queue.claim("w2")
+    assert (first.story_index, first.text, first.attempts) == (1, "a", 1)
+    assert second.story_index == 2
+    assert queue.claim("w3") is None
+
+
+def test_complete_requires_the_lease(queue):
+    queue.enqueue([(1, "a")])
+    queue.claim("w1")
+    assert not queue.complete(1, "w2")
+    assert queue.complete(1, "w1")
+    assert queue.counts() == {"done": 1}
+    assert not queue.has_unfinished()
+
+
+def test_failure_is_retried_then_final(queue):
+    queue.enqueue([(1, "a")])
+    queue.claim("w1")
+    assert queue.fail(1, "w1", "boom")
+    assert queue.counts() == {"pending": 1}
+    lease = queue.claim("w1")
+    assert lease.attempts == 2
+    queue.fail(1, "w1", "boom again")
+    assert queue.counts() == {"failed": 1}
+    assert queue.claim("w1") is None
+
+
+def test_retry_delay_holds_a_failed_story_back(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), retry_delay=3600)
+    queue.enqueue([(1, "a")])
+    queue.claim("w1")
+    queue.fail(1, "w1", "boom")
+    assert queue.claim("w1") is None
+    assert queue.has_unfinished()
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=0.05, max_attempts=3)
+    queue.enqueue([(1, "a")])
+    queue.claim("dead")
+    time.sleep(0.1)
+    lease = queue.claim("alive")
+    assert (lease.story_index, lease.attempts) == (1, 2)
+    # The dead worker's late result is refused
+    assert not queue.complete(1, "dead")
+    assert not queue.heartbeat(1, "dead")
+    assert queue.heartbeat(1, "alive")
+
+
+def test_expired_lease_counts_against_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), lease_seconds=0.05, max_attempts=1)
+    queue.enqueue([(1, "a")])
+    queue.claim("dead")
+    time.sleep(0.1)
+    assert queue.claim("other") is None
+    assert queue.counts() == {"failed": 1}
+
+
+def test_requeue_failed(queue):
+    queue.enqueue([(1, "a")])
+    for _ in range(2):
+        queue.claim("w1")
+        queue.fail(1, "w1", "boom")
+    assert queue.requeue_failed() == 1
+    assert queue.claim("w1").attempts == 1
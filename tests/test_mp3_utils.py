@@ -0,0 +1,118 @@
+import pytest
+
+from mp3_utils import Mp3FrameCounter, audio_frames, parse_frame_header, probe_mp3_duration
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo: 417-byte frames of 1152 samples
+MPEG1_HEADER = bytes([0xFF, 0xFB, 0x90, 0x00])
+MPEG1_FRAME = MPEG1_HEADER + bytes(413)
+# MPEG-2 Layer III, 48 kbps, 24 kHz, mono: 144-byte frames of 576 samples
+MPEG2_HEADER = bytes([0xFF, 0xF3, 0x64, 0xC4])
+MPEG2_FRAME = MPEG2_HEADER + bytes(140)
+
+ID3_TAG = b"ID3\x03\x00\x00\x00\x00\x00\x0a" + bytes(10)
+
+
+def info_frame(tag=b"Info", frames=None, delay=0, padding=0):
+    """
+    An MPEG-1 stereo Xing/Info frame, optionally with a frame count and a LAME delay/padding tag.
+    """
+    body = tag + (1 if frames is not None else 0).to_bytes(4, "big")
+    if frames is not None:
+        body += frames.to_bytes(4, "big")
+    body += b"LAME3.100" + bytes(12) + bytes([delay >> 4, ((delay & 0x0F) << 4) | (padding >> 8), padding & 0xFF])
+    frame = MPEG1_HEADER + bytes(32) + body
+    return frame + bytes(len(MPEG1_FRAME) - len(frame))
+
+
+def vbri_frame(frames, delay):
+    body = b"VBRI" + (1).to_bytes(2, "big") + delay.to_bytes(2, "big") + bytes(6) + frames.to_bytes(4, "big")
+    frame = MPEG1_HEADER + bytes(32) + body
+    return frame + bytes(len(MPEG1_FRAME) - len(frame))
+
+
+def test_parse_mpeg1_layer3_header():
+    header = parse_frame_header(MPEG1_FRAME)
+    assert (header.mpeg1, header.layer, header.sample_rate, header.samples, header.length, header.mono) == (True, 3, 44100, 1152, 417, False)
+
+
+def test_parse_mpeg2_layer3_header():
+    header = parse_frame_header(MPEG2_FRAME)
+    assert (header.mpeg1, header.layer, header.sample_rate, header.samples, header.length, header.mono) == (False, 3, 24000, 576, 144, True)
+
+
+def test_padding_bit_adds_a_byte():
+    assert parse_frame_header(bytes([0xFF, 0xFB, 0x92, 0x00])).length == 418
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"\xff\xfb\x90",                      # Truncated
+    bytes([0x00, 0xFB, 0x90, 0x00]),      # No sync
+    bytes([0xFF, 0xEB, 0x90, 0x00]),      # Reserved version
+    bytes([0xFF, 0xF9, 0x90, 0x00]),      # Reserved layer
+    bytes([0xFF, 0xFB, 0x00, 0x00]),      # Free-format bitrate
+    bytes([0xFF, 0xFB, 0xF0, 0x00]),      # Bad bitrate
+    bytes([0xFF, 0xFB, 0x9C, 0x00]),      # Reserved sample rate
+])
+def test_invalid_headers_are_rejected(data):
+    assert parse_frame_header(data) is None
+
+
+def test_counter_skips_id3_and_trailing_junk():
+    counter = Mp3FrameCounter()
+    counter.feed(ID3_TAG + MPEG2_FRAME * 50 + b"TAG" + bytes(125))
+    assert counter.frames == 50
+    assert counter.duration() == pytest.approx(50 * 576 / 24000)
+
+
+def test_counter_handles_byte_at_a_time_feeding():
+    counter = Mp3FrameCounter()
+    for byte in ID3_TAG + MPEG2_FRAME * 10:
+        counter.feed(bytes([byte]))
+    assert counter.frames == 10
+
+
+def test_counter_subtracts_lame_delay_and_padding():
+    counter = Mp3FrameCounter()
+    counter.feed(info_frame(delay=576, padding=1000) + MPEG1_FRAME * 10)
+    assert counter.frames == 10
+    assert (counter.encoder_delay, counter.encoder_padding) == (576, 1000)
+    assert counter.duration() == pytest.approx((10 * 1152 - 576 - 1000) / 44100)
+
+
+def test_xing_frame_count_gives_full_duration_early():
+    counter = Mp3FrameCounter()
+    counter.feed(info_frame(tag=b"Xing", frames=100) + MPEG1_FRAME)
+    assert counter.header_frames == 100
+    assert counter.duration() == pytest.approx(100 * 1152 / 44100)
+
+
+def test_vbri_header_is_honoured():
+    counter = Mp3FrameCounter()
+    counter.feed(vbri_frame(frames=20, delay=1105) + MPEG1_FRAME * 20)
+    assert (counter.frames, counter.header_frames, counter.encoder_delay) == (20, 20, 1105)
+
+
+def test_probe_mp3_duration(tmp_path):
+    path = tmp_path / "narration.mp3"
+    path.write_bytes(ID3_TAG + MPEG2_FRAME * 25)
+    assert probe_mp3_duration(str(path)) == pytest.approx(25 * 576 / 24000)
+
+
+def test_probe_rejects_non_mp3(tmp_path):
+    path = tmp_path / "not.mp3"
+    path.write_bytes(b"hello" * 100)
+    with pytest.raises(ValueError):
+        probe_mp3_duration(str(path))
+
+
+def test_audio_frames_strips_tags_and_info_frame():
+    chunk = audio_frames(ID3_TAG + info_frame(delay=576, padding=1000) + MPEG1_FRAME * 3 + b"TAG" + bytes(125))
+    assert chunk.data == MPEG1_FRAME * 3
+    assert (chunk.samples, chunk.sample_rate, chunk.encoder_delay, chunk.encoder_padding) == (3 * 1152, 44100, 576, 1000)
+
+
+def test_audio_frames_without_info_frame():
+    chunk = audio_frames(MPEG2_FRAME * 4)
+    assert chunk.data == MPEG2_FRAME * 4
+    assert (chunk.samples, chunk.encoder_delay, chunk.encoder_padding) == (4 * 576, 0, 0)
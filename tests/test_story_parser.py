@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from story_parser import StoryIndex, read_stories
+
+STORIES = (
+    "STORY 1\n"
+    "First line.\n"
+    "Second line.\n"
+    "\n"
+    "STORY 2\n"
+    "\n"
+    "STORY 3\r\n"
+    "Café au lait, naïve résumé.\r\n"
+    "STORY 4\n"
+    "  Last story.  \n"
+)
+
+
+@pytest.fixture
+def story_file(tmp_path):
+    path = tmp_path / "stories.txt"
+    path.write_bytes(STORIES.encode("utf-8"))
+    return str(path)
+
+
+def test_index_matches_read_stories(story_file):
+    index = StoryIndex(story_file)
+    assert len(index) == 3
+    assert [index.get(n) for n in range(1, 4)] == read_stories(story_file)
+
+
+def test_offsets_survive_multibyte_text_and_crlf(story_file):
+    index = StoryIndex(story_file)
+    assert index.get(1) == "First line.\nSecond line."
+    assert index.get(2) == "Café au lait, naïve résumé."
+    assert index.get(3) == "Last story."
+
+
+def test_get_out_of_range(story_file):
+    index = StoryIndex(story_file)
+    with pytest.raises(IndexError):
+        index.get(0)
+    with pytest.raises(IndexError):
+        index.get(4)
+
+
+def test_iter_range_resumes_and_clamps(story_file):
+    index = StoryIndex(story_file)
+    assert list(index.iter_range(2)) == read_stories(story_file)[1:]
+    assert list(index.iter_range(3, 10)) == ["Last story."]
+
+
+def test_saved_index_is_reused_until_the_file_changes(story_file):
+    StoryIndex(story_file)
+    assert os.path.exists(story_file + ".idx")
+    with open(story_file, "a", encoding="utf-8") as f:
+        f.write("STORY 5\nAppended.\n")
+    os.utime(story_file, (0, 12345))
+    index = StoryIndex(story_file)
+    assert len(index) == 4
+    assert index.get(4) == "Appended."
+
+
+@pytest.mark.parametrize("num_workers", [1, 2, 3, 5])
+def test_shards_cover_every_story_once(story_file, num_workers):
+    index = StoryIndex(story_file)
+    covered = []
+    for worker in range(num_workers):
+        first, last = index.shard(worker, num_workers)
+        covered.extend(range(first, last + 1))
+    assert covered == [1, 2, 3]
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        StoryIndex(str(tmp_path / "missing.txt"))
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("edge_tts")
+
+from tts_utils import split_text
+
+
+def test_short_text_is_one_chunk():
+    assert split_text("Hello there.  How are\nyou?", 100) == ["Hello there. How are you?"]
+
+
+def test_empty_text_has_no_chunks():
+    assert split_text("   ", 100) == []
+
+
+def test_sentences_are_packed_up_to_the_limit():
+    text = "One two three. Four five six. Seven eight nine."
+    assert split_text(text, 30) == ["One two three. Four five six.", "Seven eight nine."]
+
+
+def test_breaks_after_closing_quotes_and_brackets():
+    text = '"Stop!" she said. (Really.) Then it ended.'
+    assert split_text(text, 20) == ['"Stop!" she said.', "(Really.)", "Then it ended."]
+
+
+def test_long_sentence_breaks_between_words():
+    text = "word " * 30 + "end."
+    chunks = split_text(text, 24)
+    assert all(len(chunk) <= 24 for chunk in chunks)
+    assert " ".join(chunks) == " ".join(text.split())
+
+
+def test_unbreakable_word_is_cut_at_the_limit():
+    assert split_text("x" * 25, 10) == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_chunks_rejoin_to_the_normalized_text():
+    text = " ".join(f"Sentence number {i} is here!" for i in range(100))
+    chunks = split_text(text, 120)
+    assert all(len(chunk) <= 120 for chunk in chunks)
+    assert " ".join(chunks) == text
@@ -0,0 +1,56 @@
+# transcript_cache.py
+import os
+import gzip
+import json
+import hashlib
+import tempfile
+from typing import List, Optional
+
+from constants import TRANSCRIPT_CACHE_DIR
+from word_timings import Word
+
+# Rate the narration is decoded at (mono s16le) for keying and for the transcriber.
+PCM_SAMPLE_RATE = 16000
+
+
+def pcm_digest(pcm) -> str:
+    """
+    Key for PCM already decoded in memory (s16le bytes or an int16 array).
+
+    Hashing samples rather than file bytes means a WAV, MP3 or muxed MP4 of the
+    same narration map to the same key regardless of container or tags.
+    """
+    return hashlib.sha256(memoryview(pcm).cast("B")).hexdigest()
+
+
+class TranscriptCache:
+    """
+    Persistent store of word-level transcripts keyed by ``pcm_digest``.
+
+    Entries are gzipped JSON arrays of [text, start_ms, end_ms, confidence] and
+    load without importing or calling the transcription client.
+    """
+
+    def __init__(self, cache_dir: str = TRANSCRIPT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[List[Word]]:
+        try:
+            with gzip.open(self._path(key), "rt", encoding="utf-8") as entry:
+                return [Word(*w) for w in json.load(entry)]
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    def put(self, key: str, words: List[Word]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8") as entry:
+                json.dump([list(w) for w in words], entry, separators=(",", ":"), ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,252 @@
+# transcription.py
+import os
+import uuid
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from audio_pcm import decode_pcm, pcm_to_wav
+from transcript_cache import PCM_SAMPLE_RATE, TranscriptCache, pcm_digest
+from word_timings import Word, to_words
+
+# An audio file path, a URL the backend can fetch, or PCM from decode_pcm
+AudioSource = Union[str, np.ndarray]
+
+
+class TranscriptionResult(NamedTuple):
+    key: Hashable
+    words: List[Word]
+    error: Optional[Exception] = None
+
+
+class TranscriptionBackend(ABC):
+    """
+    A speech-to-text service with separate submit and poll steps.
+
+    Subclasses implement ``submit`` and ``poll``; this class runs one shared
+    polling loop for every job in flight, so any number of concurrent
+    ``transcribe`` calls (from ``transcribe_many`` or from separate stories of
+    a batch) cost one status sweep per interval. The interval starts at
+    ``min_poll_interval``, resets whenever a job finishes and backs off towards
+    ``max_poll_interval`` while nothing does.
+    """
+
+    # Whether results may go into a TranscriptCache. Its keys are the audio alone,
+    # so a backend producing placeholder words must not fill it.
+    cacheable = True
+
+    def __init__(self, submit_concurrency: int = 8, min_poll_interval: float = 1.0, max_poll_interval: float = 15.0):
+        self.submit_concurrency = submit_concurrency
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._submit_slots: Optional[asyncio.Semaphore] = None
+        self._waiting: Dict[str, asyncio.Future] = {}
+        self._poller: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def submit(self, audio: AudioSource) -> str:
+        """
+        Upload ``audio`` and queue it for transcription; return the job id.
+        """
+
+    @abstractmethod
+    async def poll(self, job_ids: List[str]) -> Dict[str, Union[List[Word], Exception]]:
+        """
+        Check the given jobs. Return words (or the error) for each job that has
+        finished; jobs still running are left out.
+        """
+
+    async def transcribe(self, audio: AudioSource, cache: Optional[TranscriptCache] = None) -> List[Word]:
+        """
+        Transcribe one audio source, sharing the polling loop with every other job in flight.
+
+        Local files are decoded to 16 kHz mono PCM once; that buffer is both the
+        cache key and what gets uploaded.
+        """
+        if isinstance(audio, str) and os.path.exists(audio):
+            audio = await asyncio.to_thread(decode_pcm, audio)
+
+        cache_key = None
+        if cache is not None and self.cacheable and not isinstance(audio, str):
+            cache_key = pcm_digest(audio)
+            cached_words = cache.get(cache_key)
+            if cached_words is not None:
+                return cached_words
+
+        if self._submit_slots is None:
+            self._submit_slots = asyncio.Semaphore(self.submit_concurrency)
+        async with self._submit_slots:
+            job_id = await self.submit(audio)
+
+        done = asyncio.get_running_loop().create_future()
+        self._waiting[job_id] = done
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll_loop())
+        words = await done
+
+        if cache_key is not None:
+            cache.put(cache_key, words)
+        return words
+
+    async def _poll_loop(self):
+        interval = self.min_poll_interval
+        while self._waiting:
+            await asyncio.sleep(interval)
+            job_ids = [job_id for job_id, done in self._waiting.items() if not done.done()]
+            try:
+                finished = await self.poll(job_ids)
+            except Exception as e:
+                logging.warning(f"Polling {len(job_ids)} transcription jobs failed: {e}")
+                finished = {}
+
+            for job_id, outcome in finished.items():
+                done = self._waiting.pop(job_id, None)
+                if done is None or done.done():
+                    continue
+                if isinstance(outcome, Exception):
+                    done.set_exception(outcome)
+                else:
+                    done.set_result(outcome)
+            # Drop callers that gave up (cancelled) so their jobs stop being polled
+            for job_id in [job_id for job_id, done in self._waiting.items() if done.done()]:
+                del self._waiting[job_id]
+
+            interval = self.min_poll_interval if finished else min(interval * 1.5, self.max_poll_interval)
+
+    async def transcribe_many(self, items: Iterable[Tuple[Hashable, AudioSource]], cache: Optional[TranscriptCache] = None) -> AsyncIterator[TranscriptionResult]:
+        """
+        Transcribe many audio sources concurrently.
+
+        Every item is submitted up front (at most ``submit_concurrency`` uploads at
+        a time) and all of them are polled together, so a batch waits on roughly
+        one transcription latency. Results are yielded as each job completes, not
+        in input order; a failure is reported through ``TranscriptionResult.error``
+        instead of aborting the batch.
+
+        Args:
+            items (Iterable[Tuple[Hashable, AudioSource]]): (key, audio) pairs; the key is
+                echoed back in the result.
+            cache (TranscriptCache, optional): Transcript store to consult and fill. Defaults to None.
+
+        Yields:
+            TranscriptionResult: The item's key, its words and any error.
+        """
+        async def run_one(key: Hashable, audio: AudioSource) -> TranscriptionResult:
+            try:
+                return TranscriptionResult(key, await self.transcribe(audio, cache))
+            except Exception as e:
+                logging.error(f"Transcription failed for {key}: {e}")
+                return TranscriptionResult(key, [], e)
+
+        tasks = [asyncio.ensure_future(run_one(key, audio)) for key, audio in items]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class AssemblyAIBackend(TranscriptionBackend):
+    """
+    AssemblyAI through its SDK: ``Transcriber.submit`` to queue, ``Transcript.get_by_id`` to poll.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, submit_concurrency: int = 8, min_poll_interval: float = 1.0, max_poll_interval: float = 15.0):
+        super().__init__(submit_concurrency, min_poll_interval, max_poll_interval)
+        import assemblyai as aai  # Only needed when this backend is used
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        self._aai = aai
+        aai.settings.api_key = api_key or os.getenv('AAI_API_KEY')
+        config = aai.TranscriptionConfig(
+            punctuate=True,
+            format_text=True
+        )
+        self._transcriber = aai.Transcriber(config=config)
+
+    async def submit(self, audio: AudioSource) -> str:
+        source = audio if isinstance(audio, str) else pcm_to_wav(audio)
+        transcript = await asyncio.to_thread(self._transcriber.submit, source)
+        if transcript.status == self._aai.TranscriptStatus.error:
+            raise Exception(f"Transcription error: {transcript.error}")
+        return transcript.id
+
+    async def poll(self, job_ids: List[str]) -> Dict[str, Union[List[Word], Exception]]:
+        transcripts = await asyncio.gather(*(
+            asyncio.to_thread(self._aai.Transcript.get_by_id, job_id) for job_id in job_ids
+        ))
+        finished = {}
+        for job_id, transcript in zip(job_ids, transcripts):
+            if transcript.status == self._aai.TranscriptStatus.completed:
+                finished[job_id] = to_words(transcript.words)
+            elif transcript.status == self._aai.TranscriptStatus.error:
+                finished[job_id] = Exception(f"Transcription error: {transcript.error}")
+        return finished
+
+
+class StubBackend(TranscriptionBackend):
+    """
+    Offline stand-in that needs no network or API key.
+
+    Each job "completes" ``latency`` seconds after submission with placeholder
+    words spread evenly over the audio's duration (taken from the PCM length,
+    so pass decoded PCM or local files rather than URLs). Its words are never
+    cached, so they can't be served to a real backend later.
+    """
+
+    cacheable = False
+
+    def __init__(self, latency: float = 0.5, words_per_second: float = 2.5, text: str = "lorem ipsum dolor sit amet", submit_concurrency: int = 8, min_poll_interval: float = 0.1, max_poll_interval: float = 1.0):
+        super().__init__(submit_concurrency, min_poll_interval, max_poll_interval)
+        self.latency = latency
+        self.words_per_second = words_per_second
+        self.vocabulary = text.split() or ["word"]
+        self._jobs: Dict[str, Tuple[float, List[Word]]] = {}
+
+    def _words_for(self, duration_ms: int) -> List[Word]:
+        count = max(1, int(duration_ms / 1000 * self.words_per_second))
+        step = duration_ms / count
+        return [
+            Word(self.vocabulary[i % len(self.vocabulary)], int(i * step), int((i + 1) * step))
+            for i in range(count)
+        ]
+
+    async def submit(self, audio: AudioSource) -> str:
+        if isinstance(audio, str):
+            raise ValueError(f"StubBackend cannot fetch {audio}; pass a local file or decoded PCM")
+        job_id = uuid.uuid4().hex
+        duration_ms = int(len(audio) * 1000 / PCM_SAMPLE_RATE)
+        self._jobs[job_id] = (asyncio.get_running_loop().time() + self.latency, self._words_for(duration_ms))
+        return job_id
+
+    async def poll(self, job_ids: List[str]) -> Dict[str, Union[List[Word], Exception]]:
+        now = asyncio.get_running_loop().time()
+        finished = {}
+        for job_id in job_ids:
+            ready_at, words = self._jobs[job_id]
+            if now >= ready_at:
+                finished[job_id] = words
+                del self._jobs[job_id]
+        return finished
+
+
+TRANSCRIPTION_BACKENDS = {
+    "assemblyai": AssemblyAIBackend,
+    "stub": StubBackend,
+}
+
+
+def make_backend(name: str = "assemblyai", **kwargs) -> TranscriptionBackend:
+    """
+    Construct a registered backend by name ("assemblyai" or "stub").
+    """
+    try:
+        backend = TRANSCRIPTION_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown transcription backend {name!r}; expected one of {sorted(TRANSCRIPTION_BACKENDS)}")
+    return backend(**kwargs)
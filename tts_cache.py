@@ -0,0 +1,156 @@
+# tts_cache.py
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import unicodedata
+from typing import List, Optional, Tuple
+
+from constants import TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES
+from word_timings import Word
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for cache keying: NFC, collapsed whitespace, stripped ends.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TTSCache:
+    """
+    Content-addressed on-disk cache of synthesized narration.
+
+    Each entry is an MP3 plus a JSON sidecar holding its duration and word
+    timings, keyed by a hash of (normalized text, voice, rate, pitch). Files are
+    written to temporary names and moved into place with ``os.replace``, and the
+    sidecar is published last, so concurrent writers and readers never observe a
+    half-written entry. The sidecar's mtime is refreshed on every hit and the
+    least recently used entries are evicted once the cache exceeds ``max_bytes``,
+    down to ``EVICT_TO`` of the budget so the next scan is many puts away.
+    """
+
+    EVICT_TO = 0.9
+
+    def __init__(self, cache_dir: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Running total of the cache size, seeded by the first full scan. Entries
+        # added by other processes are only seen by a scan, so it may run low.
+        self._size_estimate: Optional[int] = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz") -> str:
+        payload = json.dumps([normalize_text(text), voice, rate, pitch], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + ".mp3", base + ".json"
+
+    def get(self, key: str, output_file: str) -> Optional[Tuple[float, List[Word]]]:
+        """
+        Copy a cached entry to ``output_file``.
+
+        Returns:
+            Optional[Tuple[float, List[Word]]]: Duration and word timings, or None on a miss.
+        """
+        audio_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            shutil.copyfile(audio_path, output_file)
+        except (FileNotFoundError, ValueError):
+            # Missing, evicted mid-read, or a corrupt sidecar: treat as a miss
+            return None
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return meta["duration"], [Word(*w) for w in meta["words"]]
+
+    def put(self, key: str, audio_file: str, duration: float, words: List[Word]):
+        """
+        Store ``audio_file`` with its duration and word timings, then enforce the size budget.
+        """
+        audio_path, meta_path = self._paths(key)
+        entry_dir = os.path.dirname(audio_path)
+        os.makedirs(entry_dir, exist_ok=True)
+        replaced = self._entry_size(audio_path, meta_path)
+
+        fd, tmp_audio = tempfile.mkstemp(dir=entry_dir, suffix=".tmp")
+        os.close(fd)
+        fd, tmp_meta = tempfile.mkstemp(dir=entry_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as meta_file:
+                json.dump({"duration": duration, "words": [list(w) for w in words]}, meta_file, separators=(",", ":"))
+            shutil.copyfile(audio_file, tmp_audio)
+            os.replace(tmp_audio, audio_path)
+            os.replace(tmp_meta, meta_path)
+        finally:
+            for leftover in (tmp_audio, tmp_meta):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        # Walking the whole tree on every put is O(cache size); only do it when
+        # the running total says the budget may have been exceeded.
+        if self._size_estimate is None:
+            self.evict()
+            return
+        self._size_estimate += self._entry_size(audio_path, meta_path) - replaced
+        if self._size_estimate > self.max_bytes:
+            self.evict()
+
+    @staticmethod
+    def _entry_size(audio_path: str, meta_path: str) -> int:
+        try:
+            return os.path.getsize(meta_path) + os.path.getsize(audio_path)
+        except OSError:
+            return 0
+
+    def evict(self) -> int:
+        """
+        Once the cache exceeds ``max_bytes``, remove least recently used entries
+        until it fits in ``EVICT_TO`` of it.
+
+        Returns:
+            int: The cache size afterwards, which also resets the running estimate.
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                meta_path = os.path.join(root, name)
+                audio_path = meta_path[:-len(".json")] + ".mp3"
+                try:
+                    last_used = os.path.getmtime(meta_path)
+                    size = os.path.getsize(meta_path) + os.path.getsize(audio_path)
+                except OSError:
+                    continue
+                entries.append((last_used, size, audio_path, meta_path))
+                total += size
+
+        if total <= self.max_bytes:
+            self._size_estimate = total
+            return total
+
+        target = int(self.max_bytes * self.EVICT_TO)
+        entries.sort()
+        for _, size, audio_path, meta_path in entries:
+            if total <= target:
+                break
+            # Unpublish the sidecar first so readers see a miss, not a dangling entry
+            for path in (meta_path, audio_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            logging.info(f"Evicted TTS cache entry {os.path.basename(audio_path)}")
+        self._size_estimate = total
+        return total
@@ -1,14 +1,232 @@
 # tts_utils.py
 import os
+import re
+import random
 import asyncio
-from typing import Optional
+import logging
+import weakref
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, NamedTuple, Optional, Tuple, TypeVar, Union
 
+import aiohttp # type: ignore
 import edge_tts # type: ignore
-from pydub import AudioSegment # type: ignore
+from edge_tts import exceptions as edge_tts_exceptions # type: ignore
 from constants import AUDIO_DIR
+from mp3_utils import Mp3FrameCounter, audio_frames
+from tts_cache import TTSCache
+from word_timings import Word, offset_words, word_from_boundary
 
+# Failures worth retrying: dropped websockets, empty responses and timeouts.
+TRANSIENT_ERRORS = (
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    ConnectionError,
+    edge_tts_exceptions.NoAudioReceived,
+    edge_tts_exceptions.WebSocketError,
+)
 
-async def synthesize_speech_async(text: str, output_file: str, voice: Optional[str] = "en-US-AndrewMultilingualNeural") -> float:
+# Texts longer than this are split at sentence boundaries and synthesized as
+# concurrent chunks; shorter ones go to edge-tts in a single request.
+TTS_CHUNK_CHARS = 1000
+# Simultaneous edge-tts connections per event loop, shared by every story, chunk
+# and synthesize_many worker, so nested concurrency never multiplies past it.
+TTS_MAX_CONNECTIONS = 8
+
+# Whitespace after terminal punctuation, optionally closed by a quote or bracket
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?…])\s+|(?<=[.!?…][\"'”’)\]])\s+")
+
+T = TypeVar("T")
+
+_connection_slots_by_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+class SynthesisResult(NamedTuple):
+    index: int
+    output_file: str
+    duration: float
+    words: List[Word] = []
+    error: Optional[BaseException] = None
+
+
+def _communicate(text: str, voice: str, rate: str, pitch: str) -> "edge_tts.Communicate":
+    try:
+        # edge-tts 7+ emits sentence boundaries unless word boundaries are requested
+        return edge_tts.Communicate(text, voice, rate=rate, pitch=pitch, boundary="WordBoundary")
+    except TypeError:
+        # Older releases have no ``boundary`` argument and always emit WordBoundary
+        return edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
+
+
+def _connection_slots() -> asyncio.Semaphore:
+    # One semaphore per loop: a semaphore is bound to the loop it is first used on
+    loop = asyncio.get_running_loop()
+    slots = _connection_slots_by_loop.get(loop)
+    if slots is None:
+        slots = _connection_slots_by_loop[loop] = asyncio.Semaphore(TTS_MAX_CONNECTIONS)
+    return slots
+
+
+def split_text(text: str, max_chars: int = TTS_CHUNK_CHARS) -> List[str]:
+    """
+    Split ``text`` into chunks of at most ``max_chars``, breaking between sentences.
+
+    Consecutive sentences are packed into a chunk while they fit; a single
+    sentence longer than ``max_chars`` is broken between words instead.
+    """
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    pieces = []
+    for sentence in _SENTENCE_BREAK.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars + 1)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            pieces.append(sentence)
+
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] += " " + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+async def _retrying(attempt_once: Callable[[], Awaitable[T]], label: str, retries: int = 3, backoff: float = 1.0) -> T:
+    """
+    Await ``attempt_once()``, retrying transient edge-tts failures with exponential backoff.
+    """
+    attempt = 0
+    while True:
+        try:
+            return await attempt_once()
+        except TRANSIENT_ERRORS as e:
+            if attempt >= retries:
+                raise
+            delay = backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            attempt += 1
+            logging.warning(f"Transient TTS failure for {label} ({e!r}); retry {attempt}/{retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def _stream_to_file(text: str, output_file: str, voice: str, rate: str, pitch: str) -> Tuple[float, List[Word]]:
+    # Initialize the communicator with the desired voice
+    communicate = _communicate(text, voice, rate, pitch)
+
+    # Stream the synthesized speech to the output file, keeping the word timings
+    # and counting MP3 frames as they pass so the duration needs no decode
+    words = []
+    frame_counter = Mp3FrameCounter()
+    async with _connection_slots():
+        with open(output_file, "wb") as audio_out:
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    audio_out.write(chunk["data"])
+                    frame_counter.feed(chunk["data"])
+                elif chunk["type"] == "WordBoundary":
+                    words.append(word_from_boundary(chunk))
+
+    return frame_counter.duration(), words
+
+
+async def _synthesize_chunk(text: str, voice: str, rate: str, pitch: str) -> Tuple[bytes, List[Word]]:
+    """
+    Synthesize one chunk into memory. Returns its MP3 bytes and word timings.
+    """
+    audio = bytearray()
+    words = []
+    async with _connection_slots():
+        async for chunk in _communicate(text, voice, rate, pitch).stream():
+            if chunk["type"] == "audio":
+                audio += chunk["data"]
+            elif chunk["type"] == "WordBoundary":
+                words.append(word_from_boundary(chunk))
+    if not audio:
+        raise edge_tts_exceptions.NoAudioReceived(f"No audio received for chunk: {text[:40]!r}")
+    return bytes(audio), words
+
+
+async def _synthesize_chunked(chunks: List[str], output_file: str, voice: str, rate: str, pitch: str, retries: int, backoff: float) -> Tuple[float, List[Word]]:
+    """
+    Synthesize ``chunks`` concurrently, each retried on its own, and join them
+    into ``output_file`` on a single timeline.
+
+    The chunks' audio frames are concatenated as they are, without tags, header
+    frames or re-encoding, so the join is not gapless: any encoder delay and
+    padding a chunk declares stays in the stream as a few milliseconds of silence
+    at its edges. Dropping those frames would not fix it, as the frames after the
+    delay draw on the bit reservoir of the ones before. The words of each chunk
+    are therefore shifted by every sample before it plus its own delay, and the
+    duration runs to the end of the last chunk's audio, before its padding.
+    """
+    def run_one(index: int, text: str) -> Awaitable[Tuple[bytes, List[Word]]]:
+        return _retrying(
+            lambda: _synthesize_chunk(text, voice, rate, pitch),
+            f"{output_file} chunk {index + 1}/{len(chunks)}", retries, backoff
+        )
+
+    tasks = [asyncio.ensure_future(run_one(index, text)) for index, text in enumerate(chunks)]
+    try:
+        parts = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    words = []
+    total_samples = 0
+    sample_rate = 0
+    padding = 0
+    with open(output_file, "wb") as audio_out:
+        for audio, chunk_words in parts:
+            chunk = audio_frames(audio)
+            if sample_rate and chunk.sample_rate != sample_rate:
+                raise ValueError(f"Chunks of {output_file} differ in sample rate ({sample_rate} vs {chunk.sample_rate})")
+            sample_rate = chunk.sample_rate
+            # Offsets from the running sample count, so rounding never accumulates
+            words.extend(offset_words(chunk_words, (total_samples + chunk.encoder_delay) * 1000 // sample_rate))
+            total_samples += chunk.samples
+            padding = chunk.encoder_padding
+            audio_out.write(chunk.data)
+    return (total_samples - padding) / sample_rate, words
+
+
+async def _synthesize(text: str, output_file: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz", cache: Optional[TTSCache] = None, retries: int = 0, backoff: float = 1.0, chunk_chars: int = TTS_CHUNK_CHARS) -> Tuple[float, List[Word]]:
+    """
+    Synthesize ``text`` into ``output_file``, raising on failure.
+
+    Returns the duration, computed from the MP3 frame headers as the stream is
+    written, together with the WordBoundary timings edge-tts streams alongside
+    the audio. Neither needs the file to be decoded. With a ``cache``, a hit is
+    copied into place without contacting edge-tts and a miss is stored after
+    synthesis.
+
+    Text longer than ``chunk_chars`` is split at sentence boundaries and the
+    chunks are synthesized concurrently, each retried up to ``retries`` times on
+    transient failures, so a hiccup costs one chunk rather than the story. Every
+    request, chunked or not, holds one of the loop's TTS_MAX_CONNECTIONS slots
+    while it streams.
+    """
+    if cache is not None:
+        cache_key = cache.key(text, voice, rate, pitch)
+        cached = cache.get(cache_key, output_file)
+        if cached is not None:
+            return cached
+
+    chunks = split_text(text, chunk_chars)
+    if len(chunks) > 1:
+        duration, words = await _synthesize_chunked(chunks, output_file, voice, rate, pitch, retries, backoff)
+    else:
+        duration, words = await _retrying(lambda: _stream_to_file(text, output_file, voice, rate, pitch), output_file, retries, backoff)
+
+    if cache is not None:
+        cache.put(cache_key, output_file, duration, words)
+    return duration, words
+
+
+async def synthesize_speech_async(text: str, output_file: str, voice: Optional[str] = "en-US-AndrewMultilingualNeural", with_word_timings: bool = False, rate: str = "+0%", pitch: str = "+0Hz", cache: Optional[TTSCache] = None, retries: int = 3) -> Union[float, Tuple[float, List[Word]]]:
     """
     Asynchronously synthesize speech from text and save it as an MP3 file using edge-tts.
 
@@ -16,34 +234,110 @@ async def synthesize_speech_async(text: str, output_file: str, voice: Optional[s
         text (str): The text to synthesize.
         output_file (str): Path to save the audio file.
         voice (str, optional): The voice to use for synthesis. Defaults to "en-US-JennyNeural".
+        with_word_timings (bool, optional): Also return the WordBoundary timings. Defaults to False.
+        rate (str, optional): edge-tts speaking rate, e.g. "+10%". Defaults to "+0%".
+        pitch (str, optional): edge-tts pitch shift, e.g. "-5Hz". Defaults to "+0Hz".
+        cache (TTSCache, optional): Narration cache to consult and fill. Defaults to None.
+        retries (int, optional): Retries per chunk for transient failures. Defaults to 3.
 
     Returns:
-        float: Duration of the synthesized speech in seconds.
+        float: Duration of the synthesized speech in seconds (0.0 if synthesis failed), or
+        Tuple[float, List[Word]]: the duration and word timings (in milliseconds) when
+        ``with_word_timings`` is set. These can be fed to ``generate_dynamic_captions_from_words``.
     """
     try:
-        # Initialize the communicator with the desired voice
-        communicate = edge_tts.Communicate(text, voice)
-        
-        # Save the synthesized speech to the output file
-        await communicate.save(output_file)
-        
-        # Load the audio file to determine its duration
-        audio = AudioSegment.from_file(output_file)
-        # new_sample_rate = int(audio.frame_rate * 1)
-        # sped_up_audio = audio._spawn(audio.raw_data, overrides={'frame_rate': new_sample_rate}).set_frame_rate(audio.frame_rate)
-        
-        # # Export the sped-up audio to the same output file or a different one
-        # sped_up_audio.export(output_file, format="mp3")
-        
-        # Return the duration of the sped-up audio
-        duration = audio.duration_seconds
-        
-        return duration
+        duration, words = await _synthesize(text, output_file, voice, rate, pitch, cache, retries)
     except Exception as e:
         print(f"An error occurred during synthesis: {e}")
-        return 0.0
+        duration, words = 0.0, []
+    return (duration, words) if with_word_timings else duration
 
-def synthesize_speech(text: str, output_file: str, voice: Optional[str] = "en-US-ChristopherNeural") -> float:
+async def synthesize_speech_with_retry(text: str, output_file: str, voice: Optional[str] = "en-US-ChristopherNeural", retries: int = 3, backoff: float = 1.0, rate: str = "+0%", pitch: str = "+0Hz", cache: Optional[TTSCache] = None, chunk_chars: int = TTS_CHUNK_CHARS) -> Tuple[float, List[Word]]:
+    """
+    Synthesize speech, retrying transient edge-tts failures with exponential backoff.
+
+    Long texts are synthesized as concurrent sentence-aligned chunks and each
+    chunk is retried on its own; see ``_synthesize``.
+
+    Args:
+        text (str): The text to synthesize.
+        output_file (str): Path to save the audio file.
+        voice (str, optional): The voice to use for synthesis.
+        retries (int, optional): Extra attempts after the first failure, per chunk. Defaults to 3.
+        backoff (float, optional): Base delay in seconds, doubled per attempt with jitter. Defaults to 1.0.
+        rate (str, optional): edge-tts speaking rate. Defaults to "+0%".
+        pitch (str, optional): edge-tts pitch shift. Defaults to "+0Hz".
+        cache (TTSCache, optional): Narration cache to consult and fill. Defaults to None.
+        chunk_chars (int, optional): Longest text sent in one edge-tts request. Defaults to TTS_CHUNK_CHARS.
+
+    Returns:
+        Tuple[float, List[Word]]: Duration in seconds and the word timings.
+
+    Raises:
+        Exception: The last error once retries are exhausted, or any non-transient error.
+    """
+    return await _synthesize(text, output_file, voice, rate, pitch, cache, retries, backoff, chunk_chars)
+
+async def synthesize_many(items: Iterable[Tuple[str, str]], voice: Optional[str] = "en-US-ChristopherNeural", concurrency: int = 8, retries: int = 3, backoff: float = 1.0, rate: str = "+0%", pitch: str = "+0Hz", cache: Optional[TTSCache] = None) -> AsyncIterator[SynthesisResult]:
+    """
+    Synthesize many texts on the running event loop with bounded concurrency.
+
+    Results are yielded as each synthesis finishes, not in input order. A failed
+    item is reported through ``SynthesisResult.error`` instead of aborting the batch.
+
+    Args:
+        items (Iterable[Tuple[str, str]]): (text, output_file) pairs.
+        voice (str, optional): The voice to use for synthesis.
+        concurrency (int, optional): Maximum items in flight. Their edge-tts connections
+            also count against TTS_MAX_CONNECTIONS. Defaults to 8.
+        retries (int, optional): Retries per item for transient failures. Defaults to 3.
+        backoff (float, optional): Base backoff delay in seconds. Defaults to 1.0.
+        rate (str, optional): edge-tts speaking rate. Defaults to "+0%".
+        pitch (str, optional): edge-tts pitch shift. Defaults to "+0Hz".
+        cache (TTSCache, optional): Narration cache shared by every item. Defaults to None.
+
+    Yields:
+        SynthesisResult: Input index, output path, duration (0.0 on failure), word timings and error.
+    """
+    async def run_one(index: int, text: str, output_file: str) -> SynthesisResult:
+        try:
+            duration, words = await synthesize_speech_with_retry(text, output_file, voice, retries, backoff, rate, pitch, cache)
+            return SynthesisResult(index, output_file, duration, words)
+        except Exception as e:
+            logging.error(f"Synthesis failed for {output_file}: {e}")
+            return SynthesisResult(index, output_file, 0.0, [], e)
+
+    # A fixed pool of workers pulls from the shared iterator, so items are only
+    # read as a worker frees up and memory stays flat however long the input is.
+    source = enumerate(items)
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+    async def worker():
+        try:
+            for index, (text, output_file) in source:
+                await results.put(await run_one(index, text, output_file))
+        except Exception as e:
+            # The input iterator itself failed; hand the error to the consumer
+            await results.put(e)
+            return
+        await results.put(None)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(max(1, concurrency))]
+    try:
+        running = len(workers)
+        while running:
+            result = await results.get()
+            if result is None:
+                running -= 1
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                yield result
+    finally:
+        for task in workers:
+            task.cancel()
+
+def synthesize_speech(text: str, output_file: str, voice: Optional[str] = "en-US-ChristopherNeural", with_word_timings: bool = False, rate: str = "+0%", pitch: str = "+0Hz", cache: Optional[TTSCache] = None) -> Union[float, Tuple[float, List[Word]]]:
     """
     Synthesize speech from text and save it as an MP3 file using edge-tts.
 
@@ -51,14 +345,17 @@ def synthesize_speech(text: str, output_file: str, voice: Optional[str] = "en-US
         text (str): The text to synthesize.
         output_file (str): Path to save the audio file.
         voice (str, optional): The voice to use for synthesis. Defaults to "en-US-JennyNeural".
+        with_word_timings (bool, optional): Also return the WordBoundary timings. Defaults to False.
+        rate (str, optional): edge-tts speaking rate. Defaults to "+0%".
+        pitch (str, optional): edge-tts pitch shift. Defaults to "+0Hz".
+        cache (TTSCache, optional): Narration cache to consult and fill. Defaults to None.
 
     Returns:
-        float: Duration of the synthesized speech in seconds.
+        float: Duration of the synthesized speech in seconds, or (duration, words)
+        when ``with_word_timings`` is set.
     """
     os.makedirs(AUDIO_DIR, exist_ok=True)
     output_path = os.path.join(AUDIO_DIR, output_file)
     
     # Run the asynchronous synthesis
-    duration = asyncio.run(synthesize_speech_async(text, output_path, voice))
-    
-    return duration
\ No newline at end of file
+    return asyncio.run(synthesize_speech_async(text, output_path, voice, with_word_timings, rate, pitch, cache))
\ No newline at end of file
@@ -0,0 +1,48 @@
+# word_timings.py
+from typing import Iterable, List, NamedTuple
+
+
+class Word(NamedTuple):
+    """
+    A word with its timing in milliseconds, shaped like ``aai.Word`` so it can be
+    passed straight to ``generate_dynamic_captions_from_words``.
+    """
+    text: str
+    start: int
+    end: int
+    confidence: float = 1.0
+
+
+# edge-tts reports offsets and durations in 100-nanosecond ticks.
+TICKS_PER_MS = 10_000
+
+
+def word_from_boundary(chunk: dict) -> Word:
+    """
+    Convert an edge-tts ``WordBoundary`` stream event into a Word.
+    """
+    start = chunk["offset"] // TICKS_PER_MS
+    end = (chunk["offset"] + chunk["duration"]) // TICKS_PER_MS
+    return Word(chunk["text"], start, end)
+
+
+
+def to_words(words: Iterable) -> List[Word]:
+    """
+    Normalize word objects exposing text/start/end (and optionally confidence),
+    such as ``aai.Word``, to plain Words that pickle and serialize cheaply.
+    """
+    result = []
+    for w in words:
+        # A real confidence of 0.0 must survive; only a missing one defaults to 1.0
+        confidence = getattr(w, "confidence", None)
+        result.append(Word(w.text, int(w.start), int(w.end), 1.0 if confidence is None else float(confidence)))
+    return result
+
+
+def offset_words(words: Iterable[Word], offset_ms: int) -> List[Word]:
+    """
+    Shift word timings by ``offset_ms``, e.g. to place a chunk's words on the
+    timeline of the narration it was joined into.
+    """
+    return [w._replace(start=w.start + offset_ms, end=w.end + offset_ms) for w in words]